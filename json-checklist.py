@@ -1,7 +1,10 @@
 import json
 import uuid
 
-def update_finding_details(checklist_path, update_rules):
+from pg_stig.checklistIO import write_checklist
+from pg_stig.findingDetails import DetailsMerger
+
+def update_finding_details(checklist_path, update_rules, compact=False, details_policy='append'):
     """
     Update finding details for specific rules in a STIG Viewer 3 checklist.
     
@@ -11,6 +14,8 @@ def update_finding_details(checklist_path, update_rules):
         - 'rule_id': The rule_id to update
         - 'stig_id': The STIG identifier 
         - 'finding_details': New finding details text
+    :param compact: Write the checklist without indentation
+    :param details_policy: How new details combine with existing ones (see findingDetails.DETAILS_POLICIES)
     
     :return: Updated checklist data
     """
@@ -20,38 +25,42 @@ def update_finding_details(checklist_path, update_rules):
     
     # Track if any changes were made
     changes_made = False
+    details_merger = DetailsMerger(details_policy)
     
-    # Iterate through STIGs in the checklist
+    # Index rules by (stig_id, rule_id) once instead of scanning every rule per update
+    rule_index = {}
+    stigs_by_rule_id = {}
     for stig in checklist.get('stigs', []):
-        # Iterate through rules in each STIG
         for rule in stig.get('rules', []):
-            # Find rules matching the update criteria
-            matching_updates = [
-                update for update in update_rules 
-                if (update['rule_id'] == rule['rule_id'] and 
-                    update.get('stig_id', stig['stig_id']) == stig['stig_id'])
-            ]
+            rule_index[(stig['stig_id'], rule['rule_id'])] = rule
+            stigs_by_rule_id.setdefault(rule['rule_id'], []).append(stig['stig_id'])
+    
+    for update in update_rules:
+        # Find rules matching the update criteria
+        if 'stig_id' in update:
+            keys = [(update['stig_id'], update['rule_id'])]
+        else:
+            keys = [(stig_id, update['rule_id']) for stig_id in stigs_by_rule_id.get(update['rule_id'], [])]
+        
+        for key in keys:
+            rule = rule_index.get(key)
+            if rule is None:
+                continue
+            
+            # Update finding details
+            original_details = rule.get('finding_details', '')
+            new_details = update['finding_details']
+            
+            # Combine with the existing details according to the merge policy
+            rule['finding_details'] = details_merger.merge(key, original_details, new_details)
             
-            # Apply updates
-            for update in matching_updates:
-                # Update finding details
-                original_details = rule.get('finding_details', '')
-                new_details = update['finding_details']
-                
-                # Optional: Append new details instead of completely replacing
-                rule['finding_details'] = (
-                    f"{original_details}\n{new_details}".strip() 
-                    if original_details 
-                    else new_details
-                )
-                
+            if rule['finding_details'] != original_details:
                 changes_made = True
     
     # If changes were made, save the updated file
     if changes_made:
         output_path = checklist_path.replace('.json', '_updated.json')
-        with open(output_path, 'w') as file:
-            json.dump(checklist, file, indent=2)
+        write_checklist(checklist, output_path, compact=compact)
         print(f"Updated checklist saved to {output_path}")
     else:
         print("No matching rules found. No updates made.")
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+
+# jmespath is optional; without it only plain field paths are projected locally
+try:
+    import jmespath
+except ImportError:
+    jmespath = None
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pg_stig', 'az')
+DEFAULT_TTL = 3600
+
+# Slow-changing results that are reused across runs until the TTL expires
+PERSISTENT_COMMANDS = (
+    ('postgres', 'flexible-server', 'list'),
+    ('postgres', 'flexible-server', 'show'),
+    ('postgres', 'flexible-server', 'parameter', 'list'),
+)
+
+# Commands and options that carry secrets; their results are only ever kept in memory
+SECRET_COMMANDS = (
+    ('keyvault', 'secret'),
+)
+SECRET_OPTIONS = ('-p', '--admin-password', '--password', '--value')
+
+# administratorLogin, "administratorLogin", sku.name, ...
+FIELD_PATH = re.compile(r'^"?[A-Za-z_][A-Za-z0-9_]*"?(\."?[A-Za-z_][A-Za-z0-9_]*"?)*$')
+
+
+def _starts_with(args, prefixes):
+    return any(tuple(args[:len(prefix)]) == prefix for prefix in prefixes)
+
+
+def _split_query(args):
+    # Pull --query out of the arguments so the full response can be cached
+    args = list(args)
+    for index, arg in enumerate(args):
+        if arg == '--query' and index + 1 < len(args):
+            return args[:index] + args[index + 2:], args[index + 1]
+        if arg.startswith('--query='):
+            return args[:index] + args[index + 1:], arg[len('--query='):]
+    return args, None
+
+
+def _active_subscription():
+    # The default subscription decides what un-scoped commands return, so it is part of the disk cache key
+    config_dir = os.environ.get('AZURE_CONFIG_DIR', os.path.join(os.path.expanduser('~'), '.azure'))
+    try:
+        with open(os.path.join(config_dir, 'azureProfile.json'), 'r', encoding='utf-8-sig') as file:
+            profile = json.load(file)
+        for subscription in profile.get('subscriptions', []):
+            if subscription.get('isDefault'):
+                return subscription.get('id', '')
+    except (OSError, ValueError):
+        pass
+    return ''
+
+
+def display_command(command):
+    """
+    Command line for error messages, with the values of SECRET_OPTIONS masked.
+
+    :param command: Command line or argument list as passed to AzCli.run()
+    :return: Printable command line
+    """
+    if isinstance(command, str):
+        return command
+    args = list(command)
+    for index, arg in enumerate(args[:-1]):
+        if arg in SECRET_OPTIONS:
+            args[index + 1] = '***'
+    return shlex.join(args)
+
+
+def project(result, query):
+    """
+    Apply an az --query (JMESPath) expression to a full response.
+
+    :param result: Parsed JSON response
+    :param query: JMESPath expression
+    :return: Projected value
+    """
+    if jmespath is not None:
+        return jmespath.search(query, result)
+    for field in query.split('.'):
+        field = field.strip('"')
+        result = result.get(field) if isinstance(result, dict) else None
+    return result
+
+
+class AzCli:
+    """
+    Shared Azure CLI execution layer.
+
+    - Identical invocations run once per process; later calls are answered
+      from memory, and concurrent callers wait for the first one.
+    - Slow-changing results (PERSISTENT_COMMANDS) are cached on disk for ttl
+      seconds, keyed by the arguments and the active subscription. Anything
+      that carries a secret is never written to disk.
+    - --query projections are computed from the cached full response, so
+      'show --query administratorLogin' and 'show' cost one az process.
+
+    run() raises subprocess.CalledProcessError when az fails, like
+    subprocess.run(check=True), and ValueError when a command line cannot
+    be parsed; pass argument lists to avoid re-parsing values with quotes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._memory = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {'az_calls': 0, 'memory_hits': 0, 'disk_hits': 0}
+
+    def run(self, command):
+        """
+        Run an az command and return its parsed JSON output.
+
+        :param command: Command line ('az postgres flexible-server list ...') or argument list
+        :return: Parsed JSON output (None when az prints nothing)
+        """
+        args = shlex.split(command) if isinstance(command, str) else list(command)
+        if args and args[0] == 'az':
+            args = args[1:]
+
+        args, query = _split_query(args)
+        if query is not None and jmespath is None and not FIELD_PATH.match(query):
+            # Without jmespath, az evaluates anything beyond a field path itself
+            args += ['--query', query]
+            query = None
+
+        result = self._result(tuple(args))
+        return project(result, query) if query is not None else result
+
+    def _result(self, args):
+        with self._lock:
+            if args in self._memory:
+                self.stats['memory_hits'] += 1
+                return self._memory[args]
+            key_lock = self._key_locks.setdefault(args, threading.Lock())
+
+        # One az process per distinct command, even when several threads ask at once
+        with key_lock:
+            with self._lock:
+                if args in self._memory:
+                    self.stats['memory_hits'] += 1
+                    return self._memory[args]
+
+            persistent = self._persistent(args)
+            result = self._read_disk(args) if persistent else None
+            if result is None:
+                result = self._invoke(args)
+                if persistent:
+                    self._write_disk(args, result)
+            else:
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+
+            with self._lock:
+                self._memory[args] = result
+        return result
+
+    def _invoke(self, args):
+        with self._lock:
+            self.stats['az_calls'] += 1
+        completed = subprocess.run(['az', *args], capture_output=True, text=True, check=True)
+        return json.loads(completed.stdout) if completed.stdout.strip() else None
+
+    def _persistent(self, args):
+        if not self.ttl or not self.cache_dir:
+            return False
+        if _starts_with(args, SECRET_COMMANDS) or any(arg in SECRET_OPTIONS for arg in args):
+            return False
+        return _starts_with(args, PERSISTENT_COMMANDS)
+
+    def _cache_path(self, args):
+        key = json.dumps([_active_subscription(), *args])
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_disk(self, args):
+        try:
+            with open(self._cache_path(args), 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created', 0) > self.ttl:
+            return None
+        return entry.get('result')
+
+    def _write_disk(self, args, result):
+        if result is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'created': time.time(), 'args': list(args), 'result': result}, file)
+            os.replace(temp_path, self._cache_path(args))
+        except OSError:
+            # The disk cache is an optimization; a read-only home directory is not an error
+            pass
+
+    def forget_secrets(self):
+        """Forget the in-memory results that carry secrets (Key Vault secrets, connection strings with -p)."""
+        with self._lock:
+            for args in [args for args in self._memory if _starts_with(args, SECRET_COMMANDS) or any(arg in SECRET_OPTIONS for arg in args)]:
+                del self._memory[args]
+
+    def clear(self):
+        """Forget the in-memory results and delete the disk cache."""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.cache_dir, name))
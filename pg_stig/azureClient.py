@@ -0,0 +1,323 @@
+import re
+import threading
+
+# Endpoints per Azure cloud (az cloud list names)
+CLOUDS = {
+    'AzureCloud': {
+        'authority': 'login.microsoftonline.com',
+        'resource_manager': 'https://management.azure.com',
+        'keyvault_suffix': '.vault.azure.net',
+        'postgres_suffix': '.postgres.database.azure.com'
+    },
+    'AzureUSGovernment': {
+        'authority': 'login.microsoftonline.us',
+        'resource_manager': 'https://management.usgovcloudapi.net',
+        'keyvault_suffix': '.vault.usgovcloudapi.net',
+        'postgres_suffix': '.postgres.database.usgovcloudapi.net'
+    }
+}
+
+BACKENDS = ('cli', 'sdk')
+
+RESOURCE_GROUP_PATTERN = re.compile(r'/resourceGroups/([^/]+)/', re.IGNORECASE)
+
+SUBSCRIPTION_ID_PATTERN = re.compile(r'^[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}$', re.IGNORECASE)
+
+
+def connection_strings(host, admin_login=None, password=None, database='postgres'):
+    """
+    Connection strings in the shape of 'az postgres flexible-server show-connection-string'.
+
+    The CLI only fills in a template, so the in-process backends build them locally.
+    """
+    user = admin_login or '{username}'
+    password = password or '{password}'
+    return {
+        'connectionStrings': {
+            'psql': f'psql "host={host} port=5432 dbname={database} user={user} password={password} sslmode=require"',
+            'python': f"cnx = psycopg2.connect(user='{user}', password='{password}', host='{host}', port=5432, database='{database}')",
+            'jdbc': f'jdbc:postgresql://{host}:5432/{database}?user={user}&password={password}&sslmode=require'
+        }
+    }
+
+
+def _camel(key):
+    head, *rest = key.split('_')
+    return head + ''.join(word[:1].upper() + word[1:] for word in rest)
+
+
+def _cli_shape(value):
+    # SDK as_dict() uses snake_case; the CLI prints the same fields in camelCase
+    if isinstance(value, dict):
+        return {_camel(key): _cli_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_cli_shape(item) for item in value]
+    return value
+
+
+def _model_to_cli(model):
+    data = _cli_shape(model.as_dict())
+    match = RESOURCE_GROUP_PATTERN.search(data.get('id', ''))
+    if match and 'resourceGroup' not in data:
+        data['resourceGroup'] = match.group(1)
+    return data
+
+
+class CliBackend:
+    """
+    Backend that runs az commands through run(args) (e.g. azCli.AzCli.run or run_az_command).
+
+    Commands are built as argument lists, never as command lines, so
+    passwords and names with quotes or spaces reach az unchanged.
+    """
+
+    def __init__(self, run):
+        self.run = run
+
+    @staticmethod
+    def _scope(subscription):
+        return ['--subscription', subscription] if subscription else []
+
+    def current_account(self):
+        return self.run(['az', 'account', 'show'])
+
+    def list_servers(self, subscription=None):
+        return self.run(['az', 'postgres', 'flexible-server', 'list', *self._scope(subscription)])
+
+    def show_server(self, resource_group, server_name, subscription=None):
+        return self.run([
+            'az', 'postgres', 'flexible-server', 'show', '-g', resource_group, '--name', server_name,
+            *self._scope(subscription)
+        ])
+
+    def list_parameters(self, resource_group, server_name, subscription=None):
+        return self.run([
+            'az', 'postgres', 'flexible-server', 'parameter', 'list',
+            '--resource-group', resource_group, '--server-name', server_name, *self._scope(subscription)
+        ])
+
+    def get_secret(self, vault_name, secret_name):
+        return self.run(['az', 'keyvault', 'secret', 'show', '--name', secret_name, '--vault-name', vault_name, '--query', 'value'])
+
+    def connection_strings(self, server_name, admin_login=None, password=None, database='postgres'):
+        args = ['az', 'postgres', 'flexible-server', 'show-connection-string', '--server-name', server_name]
+        if admin_login:
+            args += ['-u', admin_login]
+        if password:
+            args += ['-p', password]
+        if database != 'postgres':
+            args += ['-d', database]
+        return self.run(args)
+
+
+class SdkBackend:
+    """
+    Backend that calls the Azure management and Key Vault APIs in process.
+
+    One credential (with its token cache) and one HTTP pipeline per client
+    are kept for the whole run, so calls reuse tokens and connections.
+    Needs azure-identity, azure-mgmt-rdbms and azure-keyvault-secrets.
+
+    Subscriptions may be given by ID or by name, as in subscriptions.txt;
+    names are resolved to IDs once per run (needs azure-mgmt-subscription).
+    """
+
+    def __init__(self, subscription_id, cloud='AzureCloud', credential=None):
+        try:
+            from azure.identity import DefaultAzureCredential
+            from azure.keyvault.secrets import SecretClient
+            from azure.mgmt.rdbms.postgresql_flexibleservers import PostgreSQLManagementClient
+        except ImportError as e:
+            raise ImportError(
+                "The sdk backend needs azure-identity, azure-mgmt-rdbms and azure-keyvault-secrets"
+            ) from e
+
+        if not subscription_id:
+            raise ValueError("The sdk backend needs a subscription ID or name")
+        if cloud not in CLOUDS:
+            raise ValueError(f"Unknown cloud: {cloud}. Must be one of {list(CLOUDS)}")
+
+        self.subscription_id = subscription_id
+        self.cloud = CLOUDS[cloud]
+        self.credential = credential or DefaultAzureCredential(authority=self.cloud['authority'])
+        self._secret_client_class = SecretClient
+        self._management_client_class = PostgreSQLManagementClient
+        self._management_clients = {}
+        self._secret_clients = {}
+        self._subscription_ids = None
+        self._lock = threading.Lock()
+
+    def _subscription_client(self):
+        try:
+            from azure.mgmt.subscription import SubscriptionClient
+        except ImportError as e:
+            raise ImportError("Subscription names need azure-mgmt-subscription; pass the subscription ID instead") from e
+        resource_manager = self.cloud['resource_manager']
+        return SubscriptionClient(
+            credential=self.credential,
+            base_url=resource_manager,
+            credential_scopes=[f"{resource_manager}/.default"]
+        )
+
+    def resolve_subscription(self, subscription=None):
+        """
+        Subscription ID of a subscription ID or name (default: the backend's subscription).
+
+        :raises ValueError: When the credential cannot see a subscription of that name
+        """
+        subscription = subscription or self.subscription_id
+        if SUBSCRIPTION_ID_PATTERN.match(subscription):
+            return subscription
+        with self._lock:
+            if self._subscription_ids is None:
+                self._subscription_ids = {
+                    item.display_name: item.subscription_id for item in self._subscription_client().subscriptions.list()
+                }
+            subscription_ids = self._subscription_ids
+        if subscription not in subscription_ids:
+            raise ValueError(f"Subscription {subscription} not found for the signed-in credential")
+        return subscription_ids[subscription]
+
+    def _management(self, subscription=None):
+        subscription = self.resolve_subscription(subscription)
+        with self._lock:
+            if subscription not in self._management_clients:
+                resource_manager = self.cloud['resource_manager']
+                self._management_clients[subscription] = self._management_client_class(
+                    credential=self.credential,
+                    subscription_id=subscription,
+                    base_url=resource_manager,
+                    credential_scopes=[f"{resource_manager}/.default"]
+                )
+            return self._management_clients[subscription]
+
+    def current_account(self):
+        return {'id': self.resolve_subscription()}
+
+    def list_servers(self, subscription=None):
+        return [_model_to_cli(server) for server in self._management(subscription).servers.list()]
+
+    def show_server(self, resource_group, server_name, subscription=None):
+        return _model_to_cli(self._management(subscription).servers.get(resource_group, server_name))
+
+    def list_parameters(self, resource_group, server_name, subscription=None):
+        configurations = self._management(subscription).configurations.list_by_server(resource_group, server_name)
+        return [_model_to_cli(configuration) for configuration in configurations]
+
+    def get_secret(self, vault_name, secret_name):
+        with self._lock:
+            if vault_name not in self._secret_clients:
+                self._secret_clients[vault_name] = self._secret_client_class(
+                    vault_url=f"https://{vault_name}{self.cloud['keyvault_suffix']}",
+                    credential=self.credential
+                )
+            client = self._secret_clients[vault_name]
+        return client.get_secret(secret_name).value
+
+    def connection_strings(self, server_name, admin_login=None, password=None, database='postgres'):
+        return connection_strings(f"{server_name}{self.cloud['postgres_suffix']}", admin_login, password, database)
+
+
+class FakeBackend:
+    """
+    In-memory backend for offline runs and tests.
+
+    :param servers: Server dictionaries in az CLI shape (name, resourceGroup, administratorLogin, ...);
+        an optional 'subscription' key limits a server to list_servers(subscription)
+    :param parameters: {server_name: [{'name': ..., 'value': ...}, ...]}
+    :param secrets: {(vault_name, secret_name): value}
+    """
+
+    def __init__(self, servers=None, parameters=None, secrets=None, subscription_id='00000000-0000-0000-0000-000000000000',
+                 postgres_suffix=CLOUDS['AzureCloud']['postgres_suffix']):
+        self.servers = servers or []
+        self.parameters = parameters or {}
+        self.secrets = secrets or {}
+        self.subscription_id = subscription_id
+        self.postgres_suffix = postgres_suffix
+        self.calls = []
+
+    def _server(self, resource_group, server_name):
+        for server in self.servers:
+            if server['name'] == server_name and server.get('resourceGroup') == resource_group:
+                return server
+        raise KeyError(f"Server {resource_group}/{server_name} not found")
+
+    def current_account(self):
+        self.calls.append(('current_account',))
+        return {'id': self.subscription_id}
+
+    def list_servers(self, subscription=None):
+        self.calls.append(('list_servers', subscription))
+        return [server for server in self.servers if subscription is None or server.get('subscription', subscription) == subscription]
+
+    def show_server(self, resource_group, server_name, subscription=None):
+        self.calls.append(('show_server', resource_group, server_name))
+        return self._server(resource_group, server_name)
+
+    def list_parameters(self, resource_group, server_name, subscription=None):
+        self.calls.append(('list_parameters', resource_group, server_name))
+        return self.parameters.get(server_name, [])
+
+    def get_secret(self, vault_name, secret_name):
+        self.calls.append(('get_secret', vault_name, secret_name))
+        return self.secrets[(vault_name, secret_name)]
+
+    def connection_strings(self, server_name, admin_login=None, password=None, database='postgres'):
+        self.calls.append(('connection_strings', server_name))
+        return connection_strings(f"{server_name}{self.postgres_suffix}", admin_login, password, database)
+
+
+class AzureClient:
+    """
+    The Azure operations the scan scripts use, independent of how they are performed.
+
+    Backends: CliBackend (az subprocesses through azCli), SdkBackend (in
+    process, persistent connections and token cache) and FakeBackend (offline).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def current_account(self):
+        """Active subscription, as 'az account show' prints it."""
+        return self.backend.current_account()
+
+    def list_servers(self, subscription=None):
+        """PostgreSQL Flexible Servers in the subscription (default: the active one)."""
+        return self.backend.list_servers(subscription)
+
+    def show_server(self, resource_group, server_name, subscription=None):
+        """Server details ('az postgres flexible-server show')."""
+        return self.backend.show_server(resource_group, server_name, subscription)
+
+    def list_parameters(self, resource_group, server_name, subscription=None):
+        """Server parameters as [{'name': ..., 'value': ...}]."""
+        return self.backend.list_parameters(resource_group, server_name, subscription)
+
+    def get_secret(self, vault_name, secret_name):
+        """Value of a Key Vault secret."""
+        return self.backend.get_secret(vault_name, secret_name)
+
+    def connection_strings(self, server_name, admin_login=None, password=None, database='postgres'):
+        """Connection strings in the 'show-connection-string' shape."""
+        return self.backend.connection_strings(server_name, admin_login, password, database)
+
+
+def create_azure_client(backend='cli', run=None, subscription_id=None, cloud='AzureCloud'):
+    """
+    Build an AzureClient.
+
+    :param backend: 'cli' or 'sdk'
+    :param run: Command runner for the cli backend (e.g. run_az_command)
+    :param subscription_id: Default subscription (ID or name) for the sdk backend
+    :param cloud: Azure cloud name for the sdk backend
+    :return: AzureClient
+    """
+    if backend == 'cli':
+        if run is None:
+            raise ValueError("The cli backend needs a command runner")
+        return AzureClient(CliBackend(run))
+    if backend == 'sdk':
+        return AzureClient(SdkBackend(subscription_id, cloud))
+    raise ValueError(f"Invalid Azure backend: {backend}. Must be one of {BACKENDS}")
@@ -0,0 +1,177 @@
+import hashlib
+import inspect
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from checklistSession import RecordedUpdates, base_rule_id
+from evidenceCollector import EVIDENCE_KEYS
+
+# Check scopes: what a check's result can depend on
+STATIC = 'static'      # nothing; evaluated once per run
+SERVER = 'server'      # server settings only; evaluated once per server
+DATABASE = 'database'  # the database's evidence; evaluated for every database
+
+CATEGORIES = ('CAT1', 'CAT2', 'CAT3')
+
+
+@dataclass(frozen=True)
+class Check:
+    """
+    One registered STIG check.
+
+    inputs maps each of the function's parameters (besides checklist) to
+    the server setting or evidence key it is called with, so the scan only
+    has to provide values by key and the check's scope follows from them.
+    """
+    name: str
+    function: Callable
+    category: str
+    rules: Tuple[str, ...]
+    inputs: Tuple[Tuple[str, str], ...]
+
+    @property
+    def evidence_keys(self):
+        """Per-database evidence (EVIDENCE_KEYS) the check reads."""
+        return tuple(key for _, key in self.inputs if key in EVIDENCE_KEYS)
+
+    @property
+    def scope(self):
+        if self.evidence_keys:
+            return DATABASE
+        return SERVER if self.inputs else STATIC
+
+    def run(self, checklist, settings, evidence=None):
+        """Call the check function with its declared inputs."""
+        arguments = {
+            parameter: evidence[key] if key in EVIDENCE_KEYS else settings[key]
+            for parameter, key in self.inputs
+        }
+        return self.function(checklist=checklist, **arguments)
+
+
+# Every registered check by function name
+REGISTRY: Dict[str, Check] = {}
+
+
+def stig_check(category, rules, **inputs):
+    """
+    Register a check function.
+
+    :param category: One of CATEGORIES
+    :param rules: Rule IDs the check updates
+    :param inputs: parameter=key for each input, key being a server setting
+        (serverSettings) or an evidence key (evidenceCollector.EVIDENCE_KEYS)
+    :return: Decorator that registers the function and returns it unchanged
+    """
+    if category not in CATEGORIES:
+        raise ValueError(f"Invalid category: {category}. Must be one of {CATEGORIES}")
+
+    def register(function):
+        REGISTRY[function.__name__] = Check(function.__name__, function, category, tuple(rules), tuple(inputs.items()))
+        return function
+    return register
+
+
+def _vuln_number(rule_ref):
+    # SV-214050r961683, SV-214050 and V-214050 all name vulnerability 214050
+    return base_rule_id(rule_ref).split('-', 1)[-1]
+
+
+def select_checks(checks: Iterable[Check], rules=None, categories=None) -> Tuple[Check, ...]:
+    """
+    Checks covering any of the given rules and in any of the given categories.
+
+    Every other check that writes a rule a selected check writes is selected
+    too (repeatedly, until nothing is added), so resetting and re-running the
+    selection leaves each of its rules as a full run would.
+
+    :param checks: Checks in evaluation order
+    :param rules: Rule references (full rule ID, SV- or V- number); None selects all
+    :param categories: Categories from CATEGORIES; None selects all
+    :return: Selected checks, in evaluation order
+    """
+    checks = tuple(checks)
+    wanted = {_vuln_number(rule) for rule in rules} if rules else None
+    selected = {
+        position for position, check in enumerate(checks)
+        if (not categories or check.category in categories)
+        and (wanted is None or wanted.intersection(_vuln_number(rule) for rule in check.rules))
+    }
+    while True:
+        written = {_vuln_number(rule) for position in selected for rule in checks[position].rules}
+        shared = {
+            position for position, check in enumerate(checks)
+            if position not in selected and written.intersection(_vuln_number(rule) for rule in check.rules)
+        }
+        if not shared:
+            return tuple(checks[position] for position in sorted(selected))
+        selected |= shared
+
+
+def evidence_keys(checks: Iterable[Check]) -> Tuple[str, ...]:
+    """Evidence the checks need, in EVIDENCE_KEYS order."""
+    needed = {key for check in checks for key in check.evidence_keys}
+    return tuple(key for key in EVIDENCE_KEYS if key in needed)
+
+
+def record_checks(checks, scope, settings=None):
+    """
+    Evaluate the checks of one scope against recorders instead of a checklist.
+
+    :param checks: Checks in evaluation order
+    :param scope: STATIC or SERVER
+    :param settings: Server settings, for SERVER checks
+    :return: {position in checks: RecordedUpdates}
+    """
+    recorded = {}
+    for position, check in enumerate(checks):
+        if check.scope == scope:
+            recorded[position] = RecordedUpdates()
+            check.run(recorded[position], settings)
+    return recorded
+
+
+@lru_cache(maxsize=None)
+def checks_fingerprint(checks: Tuple[Check, ...]) -> str:
+    """
+    Digest of the checks' registrations and source code.
+
+    Part of every evidence fingerprint, so checklists written by older check
+    logic or wording are rebuilt instead of reused after a deployment.
+    """
+    digest = hashlib.sha256()
+    for check in checks:
+        try:
+            source = inspect.getsource(check.function)
+        except (OSError, TypeError):
+            source = check.function.__code__.co_code.hex()
+        digest.update(json.dumps([check.name, check.category, check.rules, check.inputs, source]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def static_checks(checks: Tuple[Check, ...]):
+    """Recorded results of the STATIC checks, evaluated once per run (per process)."""
+    return record_checks(checks, STATIC)
+
+
+def shared_checks(checks: Tuple[Check, ...], settings):
+    """Recorded results of every STATIC and SERVER check for one server's settings."""
+    return {**static_checks(checks), **record_checks(checks, SERVER, settings)}
+
+
+def run_checks(checks, checklist, settings, evidence, shared: Optional[dict] = None):
+    """
+    Apply the checks to the checklist from the server settings and rendered evidence.
+
+    :param checks: Checks in evaluation order
+    :param shared: shared_checks() for the server; those checks' recorded updates are
+        applied in their place, so only DATABASE checks are evaluated here
+    """
+    for position, check in enumerate(checks):
+        if shared is not None and position in shared:
+            shared[position].apply(checklist)
+        else:
+            check.run(checklist, settings, evidence)
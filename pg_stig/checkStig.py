@@ -4,218 +4,110 @@ import csv
 from datetime import datetime
 import psycopg2
 from typing import List, Dict, Any
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from itertools import repeat, takewhile
+import io
+import os
 import sys
-import shutil
+import threading
+
+from azCli import AzCli, DEFAULT_TTL, display_command
+from azureClient import BACKENDS, CLOUDS, create_azure_client
+from checklistIO import ResultsManifest
+from checklistJournal import ChecklistJournal
+from checkRegistry import CATEGORIES, REGISTRY, checks_fingerprint, evidence_keys, run_checks, select_checks, shared_checks, stig_check
+from checklistSession import ChecklistSession, ChecklistTemplate
+from connectionPool import ServerConnectionPool
+from credentialProvider import CredentialProvider
+from evidenceCollector import collect_evidence, evidence_fingerprint, read_fingerprint, render_evidence
+from evidenceSnapshot import find_snapshots, load_snapshot, save_snapshot, snapshot_path
+from findingDetails import DEFAULT_KEEP_LAST, DETAILS_POLICIES
+from serverSettings import read_server_settings, settings_from_parameters
+from scanMetrics import ScanMetrics
+from subscriptionConfig import DEFAULT_ENVIRONMENT, discover_servers, load_subscriptions, select_subscriptions
 
 log_line_prefix_standard = "%m [%p] %q%u:%r@%d/%a-"
 
-#### ---- run azure cli commands using subprocess.run
-def run_az_command(command: str) -> List[Dict[Any, Any]]:
-    """Execute Azure CLI command and return JSON response."""
+TEMPLATE_PATH = './template/template_pg9_empty.cklb'
+MANIFEST_PATH = './results/manifest.json'
+
+# Shared az layer: repeated commands in a run, and slow-changing results across runs, are not re-run
+az_cli = AzCli()
+
+# Phase timings and counters for the run; main() opens the metrics file
+metrics = ScanMetrics()
+
+#### ---- run azure cli commands through the shared az layer
+def run_az_command(command) -> List[Dict[Any, Any]]:
+    """Execute Azure CLI command (argument list or command line) and return JSON response."""
+    # Phase named after the az subcommand, e.g. 'az postgres flexible-server show'
+    args = command.split() if isinstance(command, str) else list(command)
+    subcommand = takewhile(lambda word: not word.startswith('-'), args[1:])
+    metrics.count('az_commands')
     try:
-        result = subprocess.run(
-            command.split(),
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        # print(result)
-        return json.loads(result.stdout)
+        with metrics.phase(f"az {' '.join(subcommand)}"):
+            return az_cli.run(command)
     except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {command}")
+        print(f"Error executing command: {display_command(command)}")
         print(f"Error message: {e.stderr}")
         return []
+    except ValueError as e:
+        # Unparseable command line or output
+        print(f"Error executing command: {display_command(command)}")
+        print(f"Error message: {e}")
+        return []
     
 
-### - update details and status for specific rules: MAKE SURE TO use RULE ID and not GROUP ID
-def update_stig_findings(checklist_path, update_rules):
+#### ---- connect to one database on a server; connect_string points at the postgres database
+def connect_database(connect_string, database):
+    return psycopg2.connect(connect_string.replace('postgres?', f'{database}?'))
+
+
+def timed_connect(connect_string, database):
+    """connect_database() recorded as a 'connect' phase; the connection pools' factory."""
+    metrics.count('connections')
+    with metrics.phase('connect', database=database):
+        return connect_database(connect_string, database)
+
+
+### - update details and status for specific rules, matched by rule ID, base vuln ID or group ID
+def update_stig_findings(checklist_path, update_rules, details_policy='append'):
     """
-    Update finding details and status for specific rules in a STIG Viewer 3 checklist.
+    Update finding details and status for specific rules in a STIG Viewer 3 checklist file.
+    Checks run from main() share one ChecklistSession instead of calling this per check.
     
     :param checklist_path: Path to the STIG Viewer checklist JSON file
-    :param update_rules: List of dictionaries with rule update information
-        Each dictionary should contain:
-        - 'rule_id': The rule_id to update
-        - 'stig_id': Optional STIG identifier for precise matching
-        - 'finding_details': Optional new finding details text
-        - 'status': Optional new status (not_reviewed, not_applicable, open, not_a_finding)
+    :param update_rules: List of dictionaries with rule update information (see ChecklistSession.update_stig_findings)
+    :param details_policy: How new details combine with existing ones (see findingDetails.DETAILS_POLICIES)
     
     :return: Updated checklist data
     """
-    # Valid status options based on the JSON schema
-    VALID_STATUSES = ['not_reviewed', 'not_applicable', 'open', 'not_a_finding']
-    
-    # Load the checklist
-    with open(checklist_path, 'r') as file:
-        checklist = json.load(file)
-    
-    # Track if any changes were made
-    changes_made = False
-    
-    # Track update details for logging
-    updated_rules = []
-    
-    # Iterate through STIGs in the checklist
-    for stig in checklist.get('stigs', []):
-        # Iterate through rules in each STIG
-        for rule in stig.get('rules', []):
-            # Find rules matching the update criteria
-            matching_updates = [
-                update for update in update_rules 
-                if (update['rule_id'] == rule['rule_id'] and 
-                    update.get('stig_id', stig['stig_id']) == stig['stig_id'])
-            ]
-            
-            # Apply updates
-            for update in matching_updates:
-                # Update finding details if provided
-                if 'finding_details' in update:
-                    original_details = rule.get('finding_details', '')
-                    new_details = update['finding_details']
-                    
-                    # Append new details instead of completely replacing
-                    rule['finding_details'] = (
-                        f"{original_details}\n{new_details}".strip() 
-                        if original_details 
-                        else new_details
-                    )
-                    changes_made = True
-                
-                # Update status if provided and valid
-                if 'status' in update:
-                    if update['status'] not in VALID_STATUSES:
-                        raise ValueError(f"Invalid status: {update['status']}. Must be one of {VALID_STATUSES}")
-                    
-                    original_status = rule.get('status', 'not_reviewed')
-                    rule['status'] = update['status']
-                    changes_made = True
-                    
-                # Track which rules were updated
-                updated_rules.append({
-                    'rule_id': rule['rule_id'],
-                    'stig_id': stig['stig_id'],
-                    'original_status': original_status,
-                    'new_status': rule.get('status'),
-                    'original_details': original_details,
-                    'new_details': rule.get('finding_details', '')
-                })
-
-    # If changes were made, save the updated file
-    if changes_made:
-        output_path = checklist_path.replace('.json', '_updated.json')
-        with open(output_path, 'w') as file:
-            json.dump(checklist, file, indent=2)
-        
-        # Print detailed update log
-        print(f"Updated checklist saved to {output_path}")
-        print("\nUpdated Rules:")
-        for update in updated_rules:
-            print(f"Rule ID: {update['rule_id']} (STIG: {update['stig_id']})")
-            print(f"  Status: {update['original_status']} → {update['new_status']}")
-            print(f"  Details: {update['original_details']} → {update['new_details']}\n")
-            print()
-    else:
-        print("No matching rules found. No updates made.")
-    
-    return checklist
+    checklist = ChecklistSession.load(checklist_path, details_policy=details_policy)
+    checklist.update_stig_findings(update_rules)
+    if checklist.changes_made:
+        checklist.save(checklist_path.replace('.json', '_updated.json'))
+    return checklist.materialize()
 
 ### -------------- UPDATE FINDING STATUS IN BULK BY SEVERITY
 ### -------------- CYBER Requested all CAT II findings be open by default
-def update_findings_by_severity(checklist_path, severity_updates):
+def update_findings_by_severity(checklist_path, severity_updates, details_policy='append'):
     """
-    Update finding status for all rules matching specified severity levels.
+    Update finding status for all rules matching specified severity levels in a checklist file.
     
     :param checklist_path: Path to the STIG Viewer checklist JSON file
-    :param severity_updates: List of dictionaries with severity update rules
-        Each dictionary should contain:
-        - 'severity': Severity level to match (low, medium, high, unknown)
-        - 'status': New status to apply to matching rules
-        - 'finding_details': Optional finding details to add
+    :param severity_updates: List of dictionaries with severity update rules (see ChecklistSession.update_findings_by_severity)
+    :param details_policy: How new details combine with existing ones (see findingDetails.DETAILS_POLICIES)
     
     :return: Updated checklist data
     """
-    # Valid severity and status options based on the JSON schema
-    VALID_SEVERITIES = ['low', 'medium', 'high', 'unknown']
-    VALID_STATUSES = ['not_reviewed', 'not_applicable', 'open', 'not_a_finding']
-    
-    # Validate input
-    for update in severity_updates:
-        if update['severity'] not in VALID_SEVERITIES:
-            raise ValueError(f"Invalid severity: {update['severity']}. Must be one of {VALID_SEVERITIES}")
-        if update['status'] not in VALID_STATUSES:
-            raise ValueError(f"Invalid status: {update['status']}. Must be one of {VALID_STATUSES}")
-    
-    # Load the checklist
-    with open(checklist_path, 'r') as file:
-        checklist = json.load(file)
-    
-    # Track changes
-    changes_made = False
-    updated_rules = []
-    
-    # Iterate through STIGs in the checklist
-    for stig in checklist.get('stigs', []):
-        # Iterate through rules in each STIG
-        for rule in stig.get('rules', []):
-            # Check for matching severity updates
-            matching_updates = [
-                update for update in severity_updates 
-                if update['severity'] == rule.get('severity')
-            ]
-            
-            # Apply updates
-            for update in matching_updates:
-                # Store original values
-                original_status = rule.get('status', 'not_reviewed')
-                original_details = rule.get('finding_details', '')
-                
-                # Update status
-                rule['status'] = update['status']
-                changes_made = True
-                
-
-                
-                # Track updated rule details
-                updated_rules.append({
-                    'rule_id': rule['rule_id'],
-                    'stig_id': stig['stig_id'],
-                    'severity': rule.get('severity'),
-                    'original_status': original_status,
-                    'new_status': rule['status'],
-                    'original_details': original_details,
-                    'new_details': rule.get('finding_details', '')
-                })
-    
-    # If changes were made, save the updated file
-    if changes_made:
-        output_path = checklist_path.replace('.json', '_severity_updated.json')
-        with open(output_path, 'w') as file:
-            json.dump(checklist, file, indent=2)
-        
-        # Print summary of updates
-        print(f"Updated checklist saved to {output_path}")
-        print("\nSeverity-based Updates Summary:")
-        
-        # Group updates by severity
-        severity_summary = {}
-        for update in updated_rules:
-            severity = update['severity']
-            if severity not in severity_summary:
-                severity_summary[severity] = []
-            severity_summary[severity].append(update)
-        
-        # Print detailed summary
-        for severity, updates in severity_summary.items():
-            print(f"\n{severity.upper()} Severity Rules:")
-            print(f"  Total Updated: {len(updates)}")
-            print("  Sample Updates:")
-            for update in updates[:5]:  # Show up to 5 sample updates
-                print(f"    Rule ID: {update['rule_id']}")
-                print(f"    Status: {update['original_status']} → {update['new_status']}")
-    else:
-        print("No matching rules found. No updates made.")
-    
-    return checklist
+    checklist = ChecklistSession.load(checklist_path, details_policy=details_policy)
+    checklist.update_findings_by_severity(severity_updates)
+    if checklist.changes_made:
+        checklist.save(checklist_path.replace('.json', '_severity_updated.json'))
+    return checklist.materialize()
 
 
 #### TO DO: ADD SCHEMA VALIDATION
@@ -236,7 +128,8 @@ def parse_json_cklb(self, input_file: str) -> Dict[str, Any]:
 
 #### - STIG RULE CHECKS #####
 
-def version_check(server_version, output_file):
+@stig_check('CAT1', rules=['SV-265877r999537', 'SV-214050r961683'], server_version='server_version')
+def version_check(checklist, server_version):
     curr_versions = ["13", "14", "15", "16"]
     maj_version = server_version.split('.')[0]
     if maj_version in curr_versions:
@@ -259,11 +152,12 @@ def version_check(server_version, output_file):
         }
     ]
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def FIPS_140_update(output_file):
+@stig_check('CAT1', rules=['SV-214157r961050', 'SV-214153r961050', 'SV-214119r961857', 'SV-214117r961857'])
+def FIPS_140_update(checklist):
     result = [f'NOT A FINDING \n(https://learn.microsoft.com/en-us/azure/postgresql/flexible-server/concepts-security).  Data at rest: For storage encryption, Azure Database for PostgreSQL - Flexible Server uses the FIPS 140-2 validated cryptographic module. Data is encrypted on disk, including backups and the temporary files created while queries are running. \nThe service uses Galois/Counter Mode (GCM) mode with AES 256-bit cipher included in Azure storage encryption, and the keys are system managed. This is similar to other at-rest encryption technologies, like transparent data encryption in SQL Server or Oracle databases. Storage encryption is always on and can\'t be disabled.', 'not_a_finding']
 
     updates = [
@@ -289,11 +183,12 @@ def FIPS_140_update(output_file):
         }
     ]
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def priv_func_check(output_file, du_res, ext_res):
+@stig_check('CAT1', rules=['SV-214148r961353'], du_res='du', ext_res='extensions')
+def priv_func_check(checklist, du_res, ext_res):
     result = [f'NOT A FINDING \nReviewed system documentation: https://armyeitaas.sharepoint-mil.us/:f:/r/teams/AFC-HQ-DDSD-MADE-PRIVATE/Shared%20Documents/Cybersecurity-ATO/Cyber%20Team/Database%20Security/DB%20Security%20Documents?csf=1&web=1&e=bnsfDc\n psql \\d: {du_res} \n select * from pg_extension: {ext_res} ', 'not_a_finding']
 
     updates = [
@@ -304,12 +199,13 @@ def priv_func_check(output_file, du_res, ext_res):
         }
     ]
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
 
-def pki_check(output_file, pki_keys_res):
+@stig_check('CAT1', rules=['SV-214136r961041', 'SV-214137r961596'], pki_keys_res='pki_certs')
+def pki_check(checklist, pki_keys_res):
     result = [f'NOT A FINDING \nAccess to all PKI private keys stored/utilized by PostgreSQL are managed by Azure PaaS service.\n PKI FIlE LOCATIONS:\n{pki_keys_res}', 'not_a_finding']
 
     updates = [
@@ -326,11 +222,12 @@ def pki_check(output_file, pki_keys_res):
     ]
   
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def md5_check(output_file, md5_res):
+@stig_check('CAT1', rules=['SV-214130r981949'], md5_res='password_encryption')
+def md5_check(checklist, md5_res):
     result = [f'NOT A FINDING \n psql show password_encryption {md5_res} \nDSE Access Control Plan Documentation states: The password encryption shall be set to MD5 or SCRAM-SHA-256 in the PG Flex Server parameter password_encryption in the Azure Portal or via Azure command line tools. (https://armyeitaas.sharepoint-mil.us/:w:/r/teams/AFC-HQ-DDSD-MADE-PRIVATE/_layouts/15/Doc.aspx?sourcedoc=%7BFACBF059-B3F9-4293-8E86-6951271B999F%7D&file=DRAFT_AFC-DSE_Access_Control_Plan_(AC).docx&action=default&mobileredirect=true)\nMicrosoft has removed all permissions for non-superusers on pg_shadow.Users inside this server are not superusers.(https://learn.microsoft.com/en-us/azure/postgresql/migrate/migration-service/concepts-user-roles-migration-service)', 'not_a_finding']
 
     updates = [
@@ -341,11 +238,12 @@ def md5_check(output_file, md5_res):
         }
     ]
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def pg_crypto_check(output_file, pg_crypto_res):
+@stig_check('CAT1', rules=['SV-214120r961128', 'SV-214139r961602'], pg_crypto_res='pgcrypto')
+def pg_crypto_check(checklist, pg_crypto_res):
     result = [f'NOT A FINDING \n SELECT * FROM pg_available_extensions where name=\'pgcrypto\' {pg_crypto_res} (https://learn.microsoft.com/en-us/azure/postgresql/flexible-server/concepts-security).  Data at rest: For storage encryption, Azure Database for PostgreSQL - Flexible Server uses the FIPS 140-2 validated cryptographic module. Data is encrypted on disk, including backups and the temporary files created while queries are running. \nThe service uses Galois/Counter Mode (GCM) mode with AES 256-bit cipher included in Azure storage encryption, and the keys are system managed. This is similar to other at-rest encryption technologies, like transparent data encryption in SQL Server or Oracle databases. Storage encryption is always on and can\'t be disabled.', 'not_a_finding']
 
     updates = [
@@ -361,11 +259,12 @@ def pg_crypto_check(output_file, pg_crypto_res):
         }
     ]
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def installation_account_check(output_file):
+@stig_check('CAT1', rules=['SV-214075r960960'])
+def installation_account_check(checklist):
     result = [f'NOT A FINDING \n The PostgreSQL software installation account is only available to the Microsoft Azure internal processes for installation of the underlying resources.\n\nRoles and permissions are documented in a PG Flex server security report for each server and validated by data owner as legitimate requirements in accordance with principle of least privilege. \nDocumentation: (https://armyeitaas.sharepoint-mil.us/:f:/r/teams/AFC-HQ-DDSD-MADE-PRIVATE/Shared%20Documents/Cybersecurity-ATO/Cyber%20Team/Database%20Security/DB%20Security%20Documents?csf=1&web=1&e=bnsfDc)\n', 'not_a_finding']
 
 
@@ -377,11 +276,12 @@ def installation_account_check(output_file):
         }
     ]
 
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def access_check(output_file, du_res, dp_res):
+@stig_check('CAT1', rules=['SV-214057r960792', 'SV-214146r960969', 'SV-214061r961053'], du_res='du', dp_res='dp')
+def access_check(checklist, du_res, dp_res):
     result = [f'NOT A FINDING \n Reviewed server documenation:\n (https://armyeitaas.sharepoint-mil.us/:f:/r/teams/AFC-HQ-DDSD-MADE-PRIVATE/Shared%20Documents/Cybersecurity-ATO/Cyber%20Team/Database%20Security/DB%20Security%20Documents?csf=1&web=1&e=bnsfDc)\n Per the AFC-DSE_Access_Control_Plan_(AC), roles and permissions are documented in PG Flex Server security report\n psql \\du:{du_res} \n psql \\dp: {dp_res}', 'not_a_finding']
 
 
@@ -402,11 +302,12 @@ def access_check(output_file, du_res, dp_res):
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def data_in_transit_check(output_file, md5_res):
+@stig_check('CAT1', rules=['SV-214056r961029'], md5_res='password_encryption')
+def data_in_transit_check(checklist, md5_res):
     result = [f'NOT A FINDING \nData in transit: Azure Database for PostgreSQL - Flexible Server encrypts in-transit data with Secure Sockets Layer and Transport Layer Security (SSL/TLS). Encryption is enforced by default. For more detailed information on connection security with SSL\\TLS, see this documentation. For better security, you might choose to enable SCRAM authentication in Azure Database for PostgreSQL - Flexible Server. (https://learn.microsoft.com/en-us/azure/postgresql/flexible-server/concepts-security) \n psql show password_encryption {md5_res}', 'not_a_finding']
 
 
@@ -417,11 +318,12 @@ def data_in_transit_check(output_file, md5_res):
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def authoriziaton_check(output_file):
+@stig_check('CAT1', rules=['SV-214052r960768'])
+def authoriziaton_check(checklist):
     result = [f'NOT A FINDING \nreviewed server documentation: \nRoles and permissions are be documented in a PG Flex server security report for each server and validated by data owner as legitimate requirements in accordance with principle of least privilege.\n(https://armyeitaas.sharepoint-mil.us/:f:/r/teams/AFC-HQ-DDSD-MADE-PRIVATE/Shared%20Documents/Cybersecurity-ATO/Cyber%20Team/Database%20Security/DB%20Security%20Documents?csf=1&web=1&e=bnsfDc)\n', 'not_a_finding']
 
 
@@ -432,11 +334,12 @@ def authoriziaton_check(output_file):
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def NSA_crypto_check(output_file):
+@stig_check('CAT2', rules=['SV-220321r961857'])
+def NSA_crypto_check(checklist):
     result = [f'NA \nPostgreSQL is deployed in an unclassified environment', 'not_applicable']
 
 
@@ -447,11 +350,11 @@ def NSA_crypto_check(output_file):
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
 
     return updated_checklist
 
-def cat_II_default(output_file, status_res):
+def cat_II_default(checklist, status_res):
     
     updates = [
         {
@@ -459,11 +362,12 @@ def cat_II_default(output_file, status_res):
             'status': status_res 
         }
     ]
-    updated_checklist = update_findings_by_severity(output_file, updates)
+    updated_checklist = checklist.update_findings_by_severity(updates)
 
     return updated_checklist
 
-def pgaudit_check(output_file, shared_pre_lib_res, log_dis_res, log_conn_res):
+@stig_check('CAT2', rules=['SV-214156r961839', 'SV-214092r961824'], shared_pre_lib_res='shared_preload_libraries', log_dis_res='log_disconnections', log_conn_res='log_connections')
+def pgaudit_check(checklist, shared_pre_lib_res, log_dis_res, log_conn_res):
 
     shared_pre_lib_list = shared_pre_lib_res.split(",")
     if 'pgaudit' in shared_pre_lib_list and log_conn_res == 'on' and log_dis_res == 'on':
@@ -484,10 +388,11 @@ def pgaudit_check(output_file, shared_pre_lib_res, log_dis_res, log_conn_res):
         }
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
-def pgaudit_check2(output_file, shared_pre_lib_res, audit_log_res):
+@stig_check('CAT2', rules=['SV-214155r961836', 'SV-214154r961821', 'SV-214105r961800', 'SV-214104r961818', 'SV-214102r961812', 'SV-214101r961791', 'SV-214100r961797', 'SV-214099r961827', 'SV-214097r961809', 'SV-214091r961821', 'SV-214085r961797'], shared_pre_lib_res='shared_preload_libraries', audit_log_res='pgaudit_log')
+def pgaudit_check2(checklist, shared_pre_lib_res, audit_log_res):
 
     shared_pre_lib_list = shared_pre_lib_res.lower().split(",")
     audit_log_list = audit_log_res.lower().split(",")
@@ -554,10 +459,11 @@ def pgaudit_check2(output_file, shared_pre_lib_res, audit_log_res):
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
-def pgaudit_check3(output_file, shared_pre_lib_res, log_destination_res):
+@stig_check('CAT2', rules=['SV-214123r960888'], shared_pre_lib_res='shared_preload_libraries', log_destination_res='log_destination')
+def pgaudit_check3(checklist, shared_pre_lib_res, log_destination_res):
 
     shared_pre_lib_list = shared_pre_lib_res.lower().split(",")
     
@@ -573,10 +479,10 @@ def pgaudit_check3(output_file, shared_pre_lib_res, log_destination_res):
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
-def pgaudit_check4(output_file, shared_pre_lib_res, audit_log_res, pgaudit_log_catalog_res):
+def pgaudit_check4(checklist, shared_pre_lib_res, audit_log_res, pgaudit_log_catalog_res):
 
     shared_pre_lib_list = shared_pre_lib_res.lower().split(",")
     audit_log_list = audit_log_res.lower().split(",")
@@ -593,11 +499,12 @@ def pgaudit_check4(output_file, shared_pre_lib_res, audit_log_res, pgaudit_log_c
             'status': result[1] 
         }
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
 
-def ssl_check(output_file, ssl_enabled_res):
+@stig_check('CAT1', rules=['SV-214145r961119'], ssl_enabled_res='ssl_enabled')
+def ssl_check(checklist, ssl_enabled_res):
 
     if ssl_enabled_res == 'on':
         result = [f'NOT A FINDING \nSSL : {ssl_enabled_res}', 'not_a_finding']
@@ -612,10 +519,11 @@ def ssl_check(output_file, ssl_enabled_res):
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
-def log_line_prefix_check(output_file, log_line_prefix_res):
+@stig_check('CAT2', rules=['SV-214145r961119', 'SV-214142r960894', 'SV-214112r960897', 'SV-214116r960906'], log_line_prefix_res='log_line_prefix')
+def log_line_prefix_check(checklist, log_line_prefix_res):
 
     if log_line_prefix_res == log_line_prefix_standard:
         result = [f'NOT A FINDING \nlog_line_prefix : {log_line_prefix_res}. AFC DSE Postgres log_line_prefix standard is <{log_line_prefix_standard}>', 'not_a_finding']
@@ -645,11 +553,12 @@ def log_line_prefix_check(output_file, log_line_prefix_res):
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
 
-def log_line_prefix_check2(output_file, log_line_prefix_res, log_dis_res, log_conn_res):
+@stig_check('CAT2', rules=['SV-214138r960891', 'SV-214103r961833'], log_line_prefix_res='log_line_prefix', log_dis_res='log_disconnections', log_conn_res='log_connections')
+def log_line_prefix_check2(checklist, log_line_prefix_res, log_dis_res, log_conn_res):
     if log_line_prefix_res == log_line_prefix_standard and log_conn_res == 'on' and log_dis_res == 'on':
         result = [f'NOT A FINDING \nlog_line_prefix : {log_line_prefix_res}. AFC DSE Postgres log_line_prefix standard is <{log_line_prefix_standard}>\nDisconnect: {log_dis_res} \nConnect: {log_conn_res}', 'not_a_finding']
     else:
@@ -668,11 +577,12 @@ def log_line_prefix_check2(output_file, log_line_prefix_res, log_dis_res, log_co
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
 
-def log_line_prefix_check3(output_file, log_line_prefix_res, shared_pre_lib_res):
+@stig_check('CAT2', rules=['SV-214132r960864'], log_line_prefix_res='log_line_prefix', shared_pre_lib_res='shared_preload_libraries')
+def log_line_prefix_check3(checklist, log_line_prefix_res, shared_pre_lib_res):
 
     shared_pre_lib_list = shared_pre_lib_res.split(",")
 
@@ -689,11 +599,12 @@ def log_line_prefix_check3(output_file, log_line_prefix_res, shared_pre_lib_res)
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
 
-def log_timezone_check(output_file, log_timezone_res):
+@stig_check('CAT2', rules=['SV-214069r961443'], log_timezone_res='log_timezone')
+def log_timezone_check(checklist, log_timezone_res):
 
     if log_timezone_res.lower() == 'utc':
         result = [f'NOT A FINDING \nlog_timezone : {log_timezone_res}. AFC DSE Postgres log_timezone standard is <UTC>', 'not_a_finding']
@@ -708,10 +619,11 @@ def log_timezone_check(output_file, log_timezone_res):
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
-def client_min_messages_check(output_file, client_min_messages_res):
+@stig_check('CAT2', rules=['SV-214053r961167'], client_min_messages_res='client_min_messages')
+def client_min_messages_check(checklist, client_min_messages_res):
 
     if client_min_messages_res.lower() == 'error':
         result = [f'NOT A FINDING \nclient_min_messages : {client_min_messages_res}. AFC DSE Postgres log_timezone standard is <error>', 'not_a_finding']
@@ -726,10 +638,11 @@ def client_min_messages_check(output_file, client_min_messages_res):
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
-def port_check(output_file, port_res):
+@stig_check('CAT2', rules=['SV-214048r960966'], port_res='port')
+def port_check(checklist, port_res):
 
     if port_res == '5432':
         result = [f'NOT A FINDING \nPort : {port_res}. AFC DSE Postgres log_timezone standard is <5432>', 'not_a_finding']
@@ -744,7 +657,7 @@ def port_check(output_file, port_res):
         },
 
     ]
-    updated_checklist = update_stig_findings(output_file, updates)
+    updated_checklist = checklist.update_stig_findings(updates)
     return updated_checklist
 
 
@@ -754,186 +667,587 @@ def port_check(output_file, port_res):
 ### ----------------------------------------------------------------
 ### ----------------------------------------------------------------
 
-def main():
-    # Get all PostgreSQL Flex servers
-    servers = run_az_command('az postgres flexible-server list')
-    
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    
-    
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Run PostgreSQL Flexible Server STIG checks and write a CKLB checklist per database'
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Write checklists without indentation (smaller files, same format STIG Viewer writes)'
+    )
+    parser.add_argument(
+        '--unchanged',
+        choices=ResultsManifest.UNCHANGED_MODES,
+        default='skip',
+        help='What to do when a database checklist matches the previous run: write it anyway, skip it (default) or hard link the previous file'
+    )
+    parser.add_argument(
+        '--journal',
+        action='store_true',
+        help='Crash recovery only: append rule changes to a {checklist}.journal sidecar during the scan so checklistJournal.py can rebuild checklists a crashed run did not save; the journal is deleted as soon as its checklist is saved'
+    )
+    parser.add_argument(
+        '--replay',
+        action='store_true',
+        help='Regenerate every checklist from the evidence snapshots in results/ without contacting Azure or the servers; runs on all CPU cores (or --workers processes)'
+    )
+    parser.add_argument(
+        '--rules',
+        nargs='+',
+        metavar='RULE',
+        help='Only run the checks covering these rules (SV-214050r961683, SV-214050 or V-214050), plus any check sharing a rule with them; '
+             'each database starts from its last checklist and only the evidence those checks need is collected'
+    )
+    parser.add_argument(
+        '--category',
+        nargs='+',
+        choices=CATEGORIES,
+        help='Only run the checks in these categories; combines with --rules'
+    )
+    parser.add_argument(
+        '--metrics',
+        help='JSON lines file for phase timings and counters (default results/metrics_<timestamp>.jsonl)'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=10,
+        help='Number of slowest servers and phases in the end-of-run summary (default 10)'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Collect evidence and rebuild every checklist even when the database fingerprint matches the previous run'
+    )
+    parser.add_argument(
+        '--details-policy',
+        choices=DETAILS_POLICIES,
+        default='append',
+        help='How check output is combined with existing finding details: append (default), replace, append_if_new or keep_last'
+    )
+    parser.add_argument(
+        '--details-keep',
+        type=int,
+        default=DEFAULT_KEEP_LAST,
+        help=f'Number of evidence segments kept per rule with --details-policy keep_last (default {DEFAULT_KEEP_LAST})'
+    )
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=8,
+        help='Maximum number of database connections kept open per server (default 8)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of servers scanned in parallel (default 1); output is still printed one server at a time, in order'
+    )
+    parser.add_argument(
+        '--db-workers',
+        type=int,
+        default=1,
+        help='Number of databases scanned in parallel on each server (default 1)'
+    )
+    parser.add_argument(
+        '--parameter-source',
+        choices=('pg_settings', 'arm'),
+        default='pg_settings',
+        help='Where server parameters are read: pg_settings over the scan connection (default; ARM fills in anything missing) or az parameter list'
+    )
+    parser.add_argument(
+        '--az-cache-ttl',
+        type=int,
+        default=DEFAULT_TTL,
+        help=f'Seconds az server lists, show output and parameters are reused from the disk cache (default {DEFAULT_TTL}; 0 disables the disk cache)'
+    )
+    parser.add_argument(
+        '--azure-backend',
+        choices=BACKENDS,
+        default='cli',
+        help='How Azure is queried: az CLI subprocesses (default) or the in-process Azure SDK'
+    )
+    parser.add_argument(
+        '--subscription',
+        help='Subscription ID for the sdk backend (default: AZURE_SUBSCRIPTION_ID)'
+    )
+    parser.add_argument(
+        '--cloud',
+        choices=list(CLOUDS),
+        default='AzureUSGovernment',
+        help='Azure cloud for the sdk backend (default AzureUSGovernment)'
+    )
+    parser.add_argument(
+        '--environment',
+        nargs='+',
+        choices=list(load_subscriptions()) + ['all'],
+        default=[DEFAULT_ENVIRONMENT],
+        help=(
+            f'Environment(s) from subscriptions.txt to scan, or all (default {DEFAULT_ENVIRONMENT}). '
+            'One environment scans the active subscription; several are discovered concurrently, '
+            'scanned in one worker pool and written to results/<environment>/'
+        )
+    )
+    return parser.parse_args()
 
-    keyVaultName = "CAZDSEPKEYAKS"
-    
-    for server in servers:
-        # set server name and resource group from server variables
-        server_name = server['name']
-        resource_group = server['resourceGroup']
-        ##server_version = server['version']
-        pki_certs = ""
+class ThreadOutput(io.TextIOBase):
+    """
+    sys.stdout replacement that gives each worker thread its own buffer.
+
+    Inside capture() everything the thread prints goes to a StringIO, so
+    servers and databases scanned in parallel can be printed afterwards in
+    scan order instead of interleaved. Threads that are not capturing
+    write straight through to the real stream.
+    """
 
-        server_parameters = run_az_command(f'az postgres flexible-server parameter list --resource-group {resource_group} --server-name {server_name}')
-        count = 0
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
 
-        ### SET SERVER PARAMETER VALUES TO VARIABLES
-        for params in server_parameters:
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(text)
 
-            if(params['name'] == 'server_version'):
-                server_version = params['value']
-               
-            if(params['name'] == 'ssl_ca_file' or params['name'] == 'ssl_cert_file' or params['name'] == 'ssl_key_file' or params['name'] == 'ssl_crl_file'):
-                pki_certs += f"{params['name']} = {params['value']}\n"
+    def flush(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            self.stream.flush()
+
+    @contextmanager
+    def capture(self):
+        previous = getattr(self._local, 'buffer', None)
+        buffer = io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = previous
+
+
+def captured(output, function, *args):
+    """Run function with this thread's prints captured; return the printed text."""
+    with output.capture() as buffer:
+        function(*args)
+    return buffer.getvalue()
+
+
+def target_paths(server_name, database, timestamp, environment=None):
+    """Checklist output path and manifest key for one database."""
+    if environment:
+        return f'./results/{environment}/{server_name}_{database}_{timestamp}.cklb', f'{environment}/{server_name}/{database}'
+    return f'./results/{server_name}_{database}_{timestamp}.cklb', f'{server_name}/{database}'
+
+
+# Registered checks in evaluation order (ssl_check and log_line_prefix_check both update SV-214145)
+CHECKS = tuple(REGISTRY[check.__name__] for check in (
+    ### SET CATII default to open - turn off for testing and tracking
+    ## cat_II_default,
+
+    ### CAT 1 checks
+    version_check,
+    FIPS_140_update,
+    priv_func_check,
+    pki_check,
+    md5_check,
+    pg_crypto_check,
+    installation_account_check,
+    access_check,
+    data_in_transit_check,
+    ssl_check,
+    authoriziaton_check,
+
+    ## CAT II check
+    NSA_crypto_check,
+    pgaudit_check,
+    pgaudit_check2,
+    pgaudit_check3,
+    log_line_prefix_check,
+    log_line_prefix_check2,
+    log_line_prefix_check3,
+    log_timezone_check,
+    client_min_messages_check,
+    port_check,
+))
+
+
+def selected_checks(args):
+    """Checks chosen by --rules / --category, in evaluation order (all of CHECKS by default)."""
+    return select_checks(CHECKS, args.rules, args.category)
+
+
+def is_partial_run(args):
+    return bool(args.rules or args.category)
+
+
+def save_database_checklist(template, settings, evidence, manifest, manifest_key, output_file, fingerprint, args, shared=None):
+    """Build one database's checklist from its evidence and save it unless unchanged."""
+    empty_template = template
+    if is_partial_run(args):
+        # Only some rules are re-checked: start from the database's last checklist so the others keep their results
+        previous = manifest.entries.get(manifest_key)
+        if previous is not None and os.path.exists(previous['path']):
+            template = ChecklistTemplate.load(previous['path'])
+
+    checklist = ChecklistSession(template, details_policy=args.details_policy, details_keep=args.details_keep)
+    if args.journal:
+        checklist.journal = ChecklistJournal.for_session(checklist, output_file)
+
+    if template is not empty_template:
+        # The re-checked rules start from the empty template, so their previous evidence and
+        # status are replaced by this run's results instead of merged with them
+        checklist.reset_rules((rule for check in selected_checks(args) for rule in check.rules), empty_template)
+
+    with metrics.phase('checks'):
+        run_checks(selected_checks(args), checklist, settings, evidence, shared)
+
+    checklist.report_unmatched()
+    with metrics.phase('save'):
+        entry = checklist.save_if_changed(manifest, manifest_key, output_file, compact=args.compact, fingerprint=fingerprint)
+    metrics.count(f"checklists_{entry['status']}")
+    if entry['status'] == 'written':
+        metrics.count('bytes_written', entry['bytes'])
+    if checklist.journal is not None:
+        # The saved checklist now holds every journaled change
+        checklist.journal.discard()
+
+
+def fingerprint_context(template, args):
+    """Everything besides evidence and settings a full checklist depends on, for evidence_fingerprint()."""
+    return {
+        'template': template.content_hash,
+        'checks': checks_fingerprint(CHECKS),
+        'details_policy': args.details_policy,
+        'details_keep': args.details_keep
+    }
+
+
+def scan_database(database, pool, server_name, settings, template, manifest, args, timestamp, environment=None, shared=None):
+    """Run the selected checks against one database and save its checklist."""
+    print(f"Processing database: {database}")
+    output_file, manifest_key = target_paths(server_name, database, timestamp, environment)
+    snapshot_file = snapshot_path(server_name, database, environment)
+    
+    if is_partial_run(args):
+        # Only the evidence the selected checks read (no connection at all for server checks);
+        # no fingerprint or snapshot for a partial checklist
+        keys = evidence_keys(selected_checks(args))
+        if keys:
+            with pool.connection(database) as connection, metrics.phase('evidence'):
+                metrics.count('queries')
+                evidence = collect_evidence(connection, keys)
+        else:
+            evidence = render_evidence({})
+        save_database_checklist(template, settings, evidence, manifest, manifest_key, output_file, None, args, shared)
+        return
+
+    # Connection to the specific database, from the server's pool
+    with pool.connection(database) as connection:
+        # Digests of roles, ACLs, extensions and version; with the server settings, template, check
+        # code and details policy they decide whether last run's checklist still holds
+        with metrics.phase('fingerprint'):
+            metrics.count('queries')
+            database_fingerprint = read_fingerprint(connection)
+        fingerprint = evidence_fingerprint(database_fingerprint, settings, fingerprint_context(template, args))
+        # Only skipped while the snapshot is there, so --replay still covers the database
+        if not args.force and os.path.exists(snapshot_file):
+            entry = manifest.reuse_if_fingerprint(manifest_key, fingerprint, output_file)
+            if entry is not None:
+                print(f"Fingerprint unchanged; reusing {entry['path']} ({entry['status']})")
+                metrics.count('databases_reused')
+                return
+
+        # \du, \dp, pg_extension, password_encryption and pgcrypto in one query on this connection
+        with metrics.phase('evidence'):
+            metrics.count('queries')
+            evidence = collect_evidence(connection)
+
+    # Everything the checks read, so --replay can rebuild the checklist offline
+    with metrics.phase('snapshot'):
+        metrics.count('bytes_written', save_snapshot(snapshot_file, server_name, database, settings, evidence['rows'], database_fingerprint, environment))
+
+    save_database_checklist(template, settings, evidence, manifest, manifest_key, output_file, fingerprint, args, shared)
+
+
+# Template and manifest of a --replay worker process, set once by init_replay()
+_replay_state = {}
+
+
+def init_replay(args):
+    """ProcessPoolExecutor initializer: parse the template and read the manifest once per worker."""
+    # Timings are collected here and handed back to the parent, which owns the metrics file
+    global metrics
+    metrics = ScanMetrics()
+    _replay_state['template'] = ChecklistTemplate.load(TEMPLATE_PATH)
+    _replay_state['manifest'] = ResultsManifest(MANIFEST_PATH, unchanged=args.unchanged)
+    _replay_state['args'] = args
+    # shared_checks() per distinct server settings, so server checks run once per server here too
+    _replay_state['shared'] = {}
+
+
+def replay_snapshot(path, timestamp):
+    """
+    Rebuild one database's checklist from its evidence snapshot, in a --replay worker.
 
-            if(params['name'] == 'shared_preload_libraries'):
-                shared_preload_libraries = params['value']
+    :param path: Evidence snapshot file
+    :param timestamp: Run timestamp for the checklist file name
+    :return: (manifest key, manifest entry or None, printed output)
+    """
+    template = _replay_state['template']
+    manifest = _replay_state['manifest']
+    args = _replay_state['args']
+    manifest_key = None
 
-            if(params['name'] == 'log_disconnections'):
-                log_disconnections = params['value']
-            
-            if(params['name'] == 'log_connections'):
-                log_connections = params['value']
+    with redirect_stdout(io.StringIO()) as buffer:
+        try:
+            snapshot = load_snapshot(path)
+            server_name = snapshot['server']
+            database = snapshot['database']
+            environment = snapshot['environment']
+            print(f"Replaying database: {server_name}/{database}")
+            metrics.count('databases')
+            output_file, manifest_key = target_paths(server_name, database, timestamp, environment)
+
+            settings = snapshot['settings']
+            fingerprint = None
+            if snapshot['fingerprint'] is not None and not is_partial_run(args):
+                fingerprint = evidence_fingerprint(snapshot['fingerprint'], settings, fingerprint_context(template, args))
+            evidence = render_evidence(snapshot['evidence'])
+            settings_key = json.dumps(settings, sort_keys=True, default=str)
+            if settings_key not in _replay_state['shared']:
+                _replay_state['shared'][settings_key] = shared_checks(selected_checks(args), settings)
+            shared = _replay_state['shared'][settings_key]
+            context = {'server': server_name, 'database': database, 'environment': environment}
+            metrics.timed('database', context, save_database_checklist, template, settings, evidence, manifest, manifest_key, output_file, fingerprint, args, shared)
+        except Exception as e:
+            print(f"Error replaying {path}: {str(e)}")
 
-            if(params['name'] == 'pgaudit.log'):
-                pgaudit_log = params['value']
+    return manifest_key, manifest.entries.get(manifest_key), buffer.getvalue(), metrics.drain()
 
-            if(params['name'] == 'ssl'):
-                ssl_enabled = params['value']
 
-            if(params['name'] == 'log_line_prefix'):
-                log_line_prefix = params['value']
+def replay(args, timestamp):
+    """Regenerate every checklist from the evidence snapshots, across CPU cores and without network I/O."""
+    snapshots = find_snapshots()
+    print(f"Replaying {len(snapshots)} evidence snapshots")
 
-            if(params['name'] == 'log_timezone'):
-                log_timezone = params['value']
+    manifest = ResultsManifest(MANIFEST_PATH, unchanged=args.unchanged)
+    workers = args.workers if args.workers > 1 else os.cpu_count()
+    chunksize = max(1, len(snapshots) // (workers * 4))
 
-            if(params['name'] == 'client_min_messages'):
-                client_min_messages = params['value']
+    # Workers only return their manifest entries; this process owns manifest.json.
+    # Output is printed in snapshot order.
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_replay, initargs=(args,)) as executor:
+        for manifest_key, entry, text, worker_metrics in executor.map(replay_snapshot, snapshots, repeat(timestamp), chunksize=chunksize):
+            print(text, end='')
+            metrics.merge(*worker_metrics)
+            if entry is not None:
+                manifest.record(manifest_key, entry)
 
-            if(params['name'] == 'port'):
-                port = params['value']
+    manifest.save()
 
-            if(params['name'] == 'log_destination'):
-                log_destination = params['value']
-            
-            
-        
- 
 
-        secretName = server['name'] + "-pw"
+def scan_server(server, azure, credentials, template, manifest, args, timestamp, output):
+    """Read one server's parameters and credentials, then scan each of its databases."""
+    # set server name and resource group from server variables
+    server_name = server['name']
+    resource_group = server['resourceGroup']
+    ##server_version = server['version']
+    # Set by discover_servers() when several environments are scanned
+    environment = server.get('environment')
+    subscription = server.get('subscription')
+    
+    def arm_settings():
+        server_parameters = azure.list_parameters(resource_group, server_name, subscription)
+        return settings_from_parameters(server_parameters)
 
+    if environment:
+        print(f"\nProcessing server: {server_name} ({environment})")
+    else:
         print(f"\nProcessing server: {server_name}")
-        
-        # Get admin credentials
-        adminLogin = run_az_command(
-            f'az postgres flexible-server show -g {resource_group} --name {server_name} --query "administratorLogin"'
-        )
-        showServers = run_az_command(
-                f'az postgres flexible-server show -g {resource_group} --name {server_name}'
-        )
-        adminPW = run_az_command(
-            f'az keyvault secret show --name {secretName} --vault-name {keyVaultName} --query value'
-        )
-        admin_creds = run_az_command(
-            f'az postgres flexible-server show-connection-string --server-name {server_name} -u {adminLogin} -p {adminPW}'
-        )
     
+    pool = None
+    try:
+        # Get admin credentials; a missing server or Key Vault secret only skips this server
+        showServers = azure.show_server(resource_group, server_name, subscription)
         admin_login = showServers['administratorLogin']
+        # Prefetched at startup; only waits if this server's secret has not arrived yet
+        with metrics.phase('key_vault'):
+            adminPW = credentials.password(server_name)
+        admin_creds = azure.connection_strings(server_name, admin_login, adminPW)
 
 
         #print({admin_login})
-        #print({adminLogin})
         #print({adminPW})
 
         connect_string = f"postgresql://{admin_login}:{adminPW}@{server_name}.postgres.database.usgovcloudapi.net/postgres?sslmode=require"
-        
+
 
         if not admin_creds:
             print(f"Skipping server {server_name} - couldn't get credentials")
-            continue
-        
-        try:
-            # Parse connection string and connect
+            return
+
+        # One warm connection per database, reused by every check and closed when the server is done;
+        # never fewer connections than databases scanned at once
+        pool = ServerConnectionPool(partial(timed_connect, connect_string), max_size=max(args.pool_size, args.db_workers))
+
+        # Parse connection string and connect
+
+        ##print({connect_string})
+        with pool.connection('postgres') as connection:
+            ### SERVER PARAMETER VALUES, from pg_settings on this connection with the ARM parameter list as fallback
+            with metrics.phase('settings'):
+                if args.parameter_source == 'pg_settings':
+                    metrics.count('queries')
+                    settings = read_server_settings(connection, fallback=arm_settings)
+                else:
+                    settings = arm_settings()
 
-            ##print({connect_string})
-            connection = psycopg2.connect(connect_string)
-            
             # Get list of databases
-            with connection.cursor() as cursor:
+            metrics.count('queries')
+            with metrics.phase('list_databases'), connection.cursor() as cursor:
                 cursor.execute("""
                     SELECT datname FROM pg_database 
                     WHERE datistemplate = false;
                 """)
                 databases = [row[0] for row in cursor.fetchall()]
 
-            
-
-            
-            # For each database, get permissions
+        # Static and server-scoped checks are evaluated once here and applied to every database
+        with metrics.phase('server_checks'):
+            scan_args = (pool, server_name, settings, template, manifest, args, timestamp, environment, shared_checks(selected_checks(args), settings))
+        metrics.count('databases', len(databases))
+        context = {'server': server_name, 'environment': environment}
+
+        # For each database, get permissions
+        if args.db_workers > 1:
+            # Databases run concurrently; each one's output is printed in database order
+            with ThreadPoolExecutor(max_workers=args.db_workers) as executor:
+                futures = [
+                    executor.submit(captured, output, metrics.timed, 'database', {**context, 'database': database}, scan_database, database, *scan_args)
+                    for database in databases
+                ]
+                for future in futures:
+                    print(future.result(), end='')
+        else:
             for database in databases:
-                print(f"Processing database: {database}")
-                output_file = f'./results/{server_name}_{database}_{timestamp}.cklb'
-                
-                shutil.copy('./template/template_pg9_empty.cklb', output_file )
-
-                # Reconnect to specific databaseS
-                connection.close()
-                conn_info_db = connect_string.replace('postgres?', f'{database}?')
-
-                ##print(f"Database connection string: {conn_info_db}")
-                
-                connection = psycopg2.connect(conn_info_db)
-
-                du_res = subprocess.run(["psql", conn_info_db, "-c", "\\du"], capture_output=True)
-                du_res_string = du_res.stdout.decode(sys.stdout.encoding)
-                dp_res = subprocess.run(["psql", conn_info_db, "-c", "\\dp"], capture_output=True)
-                dp_res_string = dp_res.stdout.decode(sys.stdout.encoding)
-                ext_res = subprocess.run(["psql", conn_info_db, "-c", "SELECT * from pg_extension;"], capture_output=True)
-                ext_res_string = ext_res.stdout.decode(sys.stdout.encoding)
-                md5_res = subprocess.run(["psql", conn_info_db, "-c", "show password_encryption;"], capture_output=True)
-                md5_res_string = md5_res.stdout.decode(sys.stdout.encoding)
-                pgcrypto_res = subprocess.run(["psql", conn_info_db, "-c", "SELECT * FROM pg_available_extensions where name=\'pgcrypto\';"], capture_output=True)
-                pgcrypto_res_string = pgcrypto_res.stdout.decode(sys.stdout.encoding)
-               
-                ### SET CATII default to open - turn off for testing and tracking
-                ## catII_default_status = 'open'
-                ## cat_II_default_result = cat_II_default(output_file, catII_default_status)
-
-                ### CAT 1 checks
-                version_result = version_check(server_version, output_file)
-                fips_140_result = FIPS_140_update(output_file)
-                priv_func_check_result = priv_func_check(output_file, du_res_string, ext_res_string)
-                pki_check_result = pki_check(output_file, pki_certs)
-                md5_check_result = md5_check(output_file, md5_res_string)
-                pg_crypto_check_result = pg_crypto_check(output_file, pgcrypto_res_string)
-                installation_account_check_result = installation_account_check(output_file)
-                access_check_result = access_check(output_file, du_res_string, dp_res_string)
-                data_in_transit_check_result = data_in_transit_check(output_file, md5_res_string)
-                ssl_check_result = ssl_check(output_file, ssl_enabled)
-                authoriziaton_check_result = authoriziaton_check(output_file)
-                
-
-
-                ## CAT II check           
-                NSA_crypto_check_result = NSA_crypto_check(output_file)
-                pgaudit_check_result = pgaudit_check(output_file, shared_preload_libraries, log_disconnections, log_connections)
-                pgaudit_check2_result = pgaudit_check2(output_file, shared_preload_libraries, pgaudit_log)
-                pgaudit_check3_result = pgaudit_check3(output_file, shared_preload_libraries, log_destination)
-                log_line_prefix_check_result = log_line_prefix_check(output_file, log_line_prefix)
-                log_line_prefix_check2_result = log_line_prefix_check2(output_file, log_line_prefix, log_disconnections, log_connections)
-                log_line_prefix_check3_result = log_line_prefix_check3(output_file, log_line_prefix, shared_preload_libraries)
-                log_timezone_check_result = log_timezone_check(output_file, log_timezone)
-                client_min_messages_check_result = client_min_messages_check(output_file, client_min_messages)
-                port_check_result = port_check(output_file, port)
-
-                
-                
-            connection.close()
-            
-        except Exception as e:
-            print(f"Error processing server {server_name}: {str(e)}")
-            continue
+                metrics.timed('database', {**context, 'database': database}, scan_database, database, *scan_args)
+        
+    except Exception as e:
+        print(f"Error processing server {server_name}: {str(e)}")
+        return
+
+    finally:
+        if pool is not None:
+            pool.close_all()
+
+
+def run_server(server, azure, credentials, template, manifest, args, timestamp, output):
+    """scan_server() for a worker thread: errors are reported in the server's output instead of stopping the run."""
+    try:
+        scan_server(server, azure, credentials, template, manifest, args, timestamp, output)
+    except Exception as e:
+        print(f"Error processing server {server.get('name')}: {str(e)}")
+
+
+def main():
+    args = parse_arguments()
+    az_cli.ttl = args.az_cache_ttl
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # One JSON line per timed phase, then the run's counters
+    metrics.open(args.metrics or f'./results/metrics_{timestamp}.jsonl')
+
+    if is_partial_run(args):
+        checks = selected_checks(args)
+        if not checks:
+            print("No checks match the selected rules/categories")
+            return
+        print(f"Running {len(checks)} of {len(CHECKS)} checks: {', '.join(check.name for check in checks)}")
+        print(f"Evidence collected per database: {', '.join(evidence_keys(checks)) or 'none'}")
+
+    if args.replay:
+        replay(args, timestamp)
+        metrics.close()
+        print(metrics.summary(args.top))
+        print(f"\nScript Done")
+        return
+
+    # az subprocesses (through the shared az layer) or in-process Azure SDK clients
+    azure = create_azure_client(
+        args.azure_backend,
+        run=run_az_command,
+        subscription_id=args.subscription or os.environ.get('AZURE_SUBSCRIPTION_ID'),
+        cloud=args.cloud
+    )
+
+    # Each environment's server admin passwords live in its own Key Vault
+    subscriptions = select_subscriptions(args.environment)
+    credentials = {config.environment: CredentialProvider(azure, config.key_vault, az=az_cli) for config in subscriptions}
+
+    def prefetch(config, servers):
+        # Fetch the servers' admin passwords while the scan gets going
+        credentials[config.environment].prefetch(server['name'] for server in servers)
+
+    # Get all PostgreSQL Flex servers
+    with metrics.phase('discover'):
+        if len(subscriptions) > 1:
+            # Every subscription is listed at once and its passwords prefetched as soon as its list arrives;
+            # servers are tagged with their environment and all of them share the worker pool below
+            servers = discover_servers(azure, subscriptions, on_discovered=prefetch)
+            for config in subscriptions:
+                os.makedirs(f'./results/{config.environment}', exist_ok=True)
+        else:
+            # The selected environment's subscription, not whichever one az has active; servers are
+            # tagged with it so show/parameter calls target it too (output paths stay untagged)
+            config = subscriptions[0]
+            servers = [{**server, 'subscription': config.subscription} for server in azure.list_servers(config.subscription) or []]
+            prefetch(config, servers)
+    metrics.count('servers', len(servers))
+
+    def server_credentials(server):
+        return credentials[server.get('environment', subscriptions[0].environment)]
+
+    def server_context(server):
+        return {'server': server['name'], 'environment': server.get('environment')}
+    
+
+    # Parse the empty checklist once; each database gets an overlay of its own changes
+    with metrics.phase('template'):
+        template = ChecklistTemplate.load(TEMPLATE_PATH)
+
+    # Content hashes of the previous run's checklists, so unchanged ones are not rewritten
+    manifest = ResultsManifest(MANIFEST_PATH, unchanged=args.unchanged)
+
+    # Parallel scans print through per-thread buffers so each server's log stays in one piece
+    output = ThreadOutput(sys.stdout)
+    if args.workers > 1 or args.db_workers > 1:
+        sys.stdout = output
+
+    try:
+        if args.workers > 1:
+            # Servers are scanned concurrently and their output is printed in server order
+            # as soon as every earlier server has finished
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                futures = [
+                    executor.submit(
+                        captured, output, metrics.timed, 'server', server_context(server),
+                        run_server, server, azure, server_credentials(server), template, manifest, args, timestamp, output
+                    )
+                    for server in servers
+                ]
+                for future in futures:
+                    print(future.result(), end='', flush=True)
+        else:
+            for server in servers:
+                metrics.timed('server', server_context(server), run_server, server, azure, server_credentials(server), template, manifest, args, timestamp, output)
+    finally:
+        sys.stdout = output.stream
+        for provider in credentials.values():
+            provider.close()
     
+    manifest.save()
+    metrics.close({'az_processes': az_cli.stats['az_calls'], 'az_memory_hits': az_cli.stats['memory_hits'], 'az_disk_hits': az_cli.stats['disk_hits']})
+    print(metrics.summary(args.top))
     print(f"\nScript Done")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
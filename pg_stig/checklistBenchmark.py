@@ -0,0 +1,413 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from checklistIO import write_checklist
+from checklistModel import Rule
+from checklistSession import ChecklistSession
+
+# update.py lives in the repository root and imports pg_stig as a package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from update import update_checklist_with_database_info  # noqa: E402
+
+# Bump when cases or operations change so old result files are not compared against new ones
+BENCHMARK_VERSION = 2
+
+UPDATE_COUNTS = (1, 100, 10_000)
+
+# Synthetic checklist sizes: realistic single-STIG scans up to extreme multi-STIG documents.
+# details_bytes is the finding_details size of each update. In the evidence case the checklist
+# itself carries several megabytes of evidence on evidence_rules rules, and evidence_updates
+# updates each carry that much again
+CASES = {
+    'small': {'stigs': 1, 'rules': 200, 'details_bytes': 2_000, 'update_counts': UPDATE_COUNTS},
+    'medium': {'stigs': 5, 'rules': 1_000, 'details_bytes': 2_000, 'update_counts': UPDATE_COUNTS},
+    'large': {'stigs': 20, 'rules': 5_000, 'details_bytes': 2_000, 'update_counts': UPDATE_COUNTS},
+    'evidence': {
+        'stigs': 1, 'rules': 200, 'details_bytes': 2_000, 'update_counts': UPDATE_COUNTS,
+        'evidence_rules': 10, 'evidence_bytes': 4_000_000, 'evidence_updates': 10
+    },
+}
+DEFAULT_CASES = ('small', 'medium', 'large', 'evidence')
+
+SEVERITIES = ('high', 'medium', 'medium', 'medium', 'low')
+STATUSES = ('open', 'not_a_finding', 'not_applicable')
+WORDS = (
+    'database', 'audit', 'role', 'privilege', 'postgresql', 'configure', 'log', 'connection',
+    'encryption', 'account', 'access', 'system', 'must', 'record', 'session', 'the', 'of', 'and',
+    'to', 'is', 'verify', 'parameter', 'server', 'security', 'object', 'owner', 'schema', 'grant'
+)
+
+
+def synthetic_text(rng, length):
+    """Deterministic prose of at least length characters."""
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def synthetic_evidence(rng, length):
+    """Deterministic psql-style evidence text of at least length characters."""
+    row = ' | '.join(synthetic_text(rng, 24) for _ in range(4)) + '\n'
+    return row * (length // len(row) + 1)
+
+
+def synthetic_checklist(stigs, rules, seed=0, evidence_rules=0, evidence_bytes=0):
+    """
+    Build a synthetic STIG Viewer 3 checklist.
+
+    Rules are spread evenly over the STIGs and carry every field of the CKLB
+    schema. Template text (discussion, check_content, fix_text, ...) repeats
+    across rules the way it does in real STIGs.
+
+    :param stigs: Number of STIGs in the checklist
+    :param rules: Total number of rules across all STIGs
+    :param seed: Random seed; the same seed always produces the same checklist
+    :param evidence_rules: Number of rules, spread over the checklist, that already hold evidence
+    :param evidence_bytes: Size of the finding_details on each of those rules
+    :return: Checklist data in STIG Viewer 3 format
+    """
+    rng = random.Random(seed)
+    evidence = synthetic_evidence(rng, evidence_bytes) if evidence_rules else ''
+    evidence_every = rules // evidence_rules if evidence_rules else 0
+    rule_number = 0
+    texts = {
+        'rule_title': [synthetic_text(rng, 90) for _ in range(50)],
+        'fix_text': [synthetic_text(rng, 600) for _ in range(50)],
+        'check_content': [synthetic_text(rng, 900) for _ in range(50)],
+        'discussion': [synthetic_text(rng, 1_200) for _ in range(50)],
+    }
+
+    checklist_stigs = []
+    vuln = 200_000
+    for stig_pos in range(stigs):
+        stig_uuid = str(uuid.UUID(int=rng.getrandbits(128)))
+        # Alternate database and OS STIGs so update_checklist_with_database_info has both to scan
+        if stig_pos % 2 == 0:
+            stig_name = f'PostgreSQL Database {stig_pos} Security Technical Implementation Guide'
+        else:
+            stig_name = f'Operating System {stig_pos} Security Technical Implementation Guide'
+        stig_id = f'SYNTHETIC_{stig_pos}_STIG'
+        count = rules // stigs + (1 if stig_pos < rules % stigs else 0)
+
+        stig_rules = []
+        for rule_pos in range(count):
+            vuln += 1
+            values = {
+                'group_id_src': f'V-{vuln}',
+                'group_tree': [{'id': f'V-{vuln}', 'title': 'SRG-APP-000001-DB-000001', 'description': '<GroupDescription></GroupDescription>'}],
+                'group_id': f'V-{vuln}',
+                'severity': rng.choice(SEVERITIES),
+                'group_title': 'SRG-APP-000001-DB-000001',
+                'rule_id_src': f'SV-{vuln}r{900_000 + rule_pos}_rule',
+                'rule_id': f'SV-{vuln}r{900_000 + rule_pos}',
+                'rule_version': f'SYN-00-{rule_pos:06d}',
+                'rule_title': rng.choice(texts['rule_title']),
+                'fix_text': rng.choice(texts['fix_text']),
+                'weight': '10.0',
+                'check_content': rng.choice(texts['check_content']),
+                'check_content_ref': {'href': f'{stig_id}.xml', 'name': 'M'},
+                'classification': 'Unclassified',
+                'discussion': rng.choice(texts['discussion']),
+                'legacy_ids': [],
+                'ccis': [f'CCI-{rng.randrange(1, 4_000):06d}'],
+                'reference_identifier': '6000',
+                'uuid': str(uuid.UUID(int=rng.getrandbits(128))),
+                'stig_uuid': stig_uuid,
+                'status': 'not_reviewed',
+                'overrides': {},
+            }
+            if evidence_every and rule_number % evidence_every == 0 and rule_number // evidence_every < evidence_rules:
+                values['status'] = 'open'
+                values['finding_details'] = evidence
+            rule_number += 1
+            stig_rules.append({field: values.get(field, '') for field in Rule.FIELDS})
+
+        checklist_stigs.append({
+            'stig_name': stig_name,
+            'display_name': stig_name.replace(' Security Technical Implementation Guide', ''),
+            'stig_id': stig_id,
+            'release_info': 'Release: 1 Benchmark Date: 01 Jan 2026',
+            'uuid': stig_uuid,
+            'reference_identifier': '6000',
+            'size': count,
+            'rules': stig_rules,
+        })
+
+    return {
+        'title': 'synthetic_benchmark',
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'stigs': checklist_stigs,
+        'active': False,
+        'mode': 2,
+        'has_path': True,
+        'target_data': {
+            'target_type': 'Computing', 'host_name': '', 'ip_address': '', 'mac_address': '', 'fqdn': '',
+            'comments': '', 'role': 'None', 'is_web_database': False, 'technology_area': '',
+            'web_db_site': '', 'web_db_instance': '', 'classification': None
+        },
+    }
+
+
+def synthetic_updates(checklist, count, details_bytes, seed=0):
+    """
+    Build update_stig_findings() input for count rules of checklist.
+
+    Rules are visited in a shuffled order and reused once every rule has
+    been updated, so counts above the rule total update rules repeatedly.
+
+    :param checklist: Checklist built by synthetic_checklist()
+    :param count: Number of updates
+    :param details_bytes: Size of each update's finding_details
+    :param seed: Random seed
+    :return: List of update dictionaries
+    """
+    rng = random.Random(seed)
+    rule_ids = [rule['rule_id'] for stig in checklist['stigs'] for rule in stig['rules']]
+    rng.shuffle(rule_ids)
+    evidence = synthetic_evidence(rng, details_bytes)
+    return [
+        {
+            'rule_id': rule_ids[index % len(rule_ids)],
+            'status': rng.choice(STATUSES),
+            'finding_details': evidence,
+        }
+        for index in range(count)
+    ]
+
+
+def measure(setup, run, repeat):
+    """
+    Time run(setup()) repeat times, then measure its peak allocation once.
+
+    setup() is not timed. Memory is measured in a separate pass because
+    tracemalloc slows the code it traces.
+
+    :return: Dictionary of min/median seconds and tracemalloc peak bytes
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            state = setup()
+            gc.collect()
+            start = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - start)
+
+        state = setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(state)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'min_seconds': round(min(times), 6),
+        'median_seconds': round(statistics.median(times), 6),
+        'peak_bytes': peak,
+    }
+
+
+def benchmark_case(name, case, directory, repeat, seed=0):
+    """
+    Run every operation for one synthetic checklist size.
+
+    :param name: Case name from CASES
+    :param case: Case definition from CASES
+    :param directory: Scratch directory for the synthetic files
+    :param repeat: Timed runs per operation
+    :param seed: Random seed for the checklist and updates
+    :return: List of result dictionaries, one per operation
+    """
+    checklist = synthetic_checklist(case['stigs'], case['rules'], seed, case.get('evidence_rules', 0), case.get('evidence_bytes', 0))
+    # update_checklist_with_database_info() derives its output name from '.json'
+    checklist_path = os.path.join(directory, f'{name}.json')
+    output_path = os.path.join(directory, f'{name}_output.cklb')
+    write_checklist(checklist, checklist_path)
+    updates = {
+        count: synthetic_updates(checklist, count, case['details_bytes'], seed)
+        for count in case['update_counts']
+    }
+    evidence_updates = case.get('evidence_updates', 0)
+    if evidence_updates:
+        large_updates = synthetic_updates(checklist, evidence_updates, case['evidence_bytes'], seed)
+    del checklist
+
+    def loaded(compact=False):
+        return ChecklistSession.load(checklist_path, compact=compact)
+
+    def updated(count):
+        return loaded().update_stig_findings(updates[count])
+
+    severity_update = [{
+        'severity': 'medium',
+        'status': 'not_a_finding',
+        'finding_details': updates[case['update_counts'][0]][0]['finding_details'],
+    }]
+    database_info = {'database_name': 'benchmark_db', 'server_name': 'benchmark-server'}
+    save_count = case['update_counts'][1]
+
+    operations = [
+        ('load', lambda: None, lambda _: loaded()),
+        ('load_compact', lambda: None, lambda _: loaded(compact=True)),
+    ]
+    for count in case['update_counts']:
+        operations.append((
+            f'update_stig_findings_{count}',
+            loaded,
+            lambda session, count=count: session.update_stig_findings(updates[count])
+        ))
+    if evidence_updates:
+        operations.append((
+            f'update_stig_findings_{evidence_updates}_evidence',
+            loaded,
+            lambda session: session.update_stig_findings(large_updates)
+        ))
+    operations += [
+        ('update_findings_by_severity', loaded, lambda session: session.update_findings_by_severity(severity_update)),
+        (f'save_{save_count}_updates', lambda: updated(save_count), lambda session: session.save(output_path)),
+        (f'save_compact_{save_count}_updates', lambda: updated(save_count), lambda session: session.save(output_path, compact=True)),
+        ('update_checklist_with_database_info', lambda: None, lambda _: update_checklist_with_database_info(checklist_path, database_info)),
+    ]
+
+    file_bytes = os.path.getsize(checklist_path)
+    results = []
+    for operation, setup, run in operations:
+        result = {
+            'case': name,
+            'operation': operation,
+            'stigs': case['stigs'],
+            'rules': case['rules'],
+            'details_bytes': case['details_bytes'],
+            'evidence_rules': case.get('evidence_rules', 0),
+            'evidence_bytes': case.get('evidence_bytes', 0),
+            'file_bytes': file_bytes,
+            'repeat': repeat,
+        }
+        result.update(measure(setup, run, repeat))
+        results.append(result)
+        print(format_result(result), file=sys.stderr)
+    return results
+
+
+def format_result(result, baseline=None):
+    """One fixed-width line per operation; with a baseline, the median ratio against it."""
+    line = (
+        f"{result['case']:<9} {result['operation']:<38} "
+        f"median {result['median_seconds'] * 1000:>10.2f} ms  min {result['min_seconds'] * 1000:>10.2f} ms  "
+        f"peak {result['peak_bytes'] / 2 ** 20:>9.1f} MiB"
+    )
+    if baseline is not None:
+        line += f"  x{result['median_seconds'] / max(baseline['median_seconds'], 1e-9):.2f} vs baseline"
+    return line
+
+
+def load_results(results_path):
+    """
+    Read a results file written with --output.
+
+    :param results_path: JSON lines file
+    :return: Dictionary of (case, operation) -> result
+    """
+    results = {}
+    with open(results_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            record = json.loads(line)
+            if 'benchmark_version' in record and record['benchmark_version'] != BENCHMARK_VERSION:
+                raise ValueError(f"{results_path} was written by benchmark version {record['benchmark_version']}, not {BENCHMARK_VERSION}")
+            if 'case' in record:
+                results[(record['case'], record['operation'])] = record
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark loading, updating and saving synthetic STIG checklists (offline)'
+    )
+    parser.add_argument(
+        '--cases',
+        nargs='+',
+        choices=list(CASES),
+        default=list(DEFAULT_CASES),
+        help='Checklist sizes to benchmark (default: all)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Timed runs per operation; the median and minimum are reported (default: 5)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed for the synthetic checklists (default: 0)'
+    )
+    parser.add_argument(
+        '--output',
+        help='Write results as JSON lines to this file'
+    )
+    parser.add_argument(
+        '--compare',
+        help='Results file from an earlier run; report each median against it'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=1.25,
+        help='Median ratio above the --compare baseline that counts as a regression (default: 1.25)'
+    )
+    args = parser.parse_args()
+
+    baseline = load_results(args.compare) if args.compare else {}
+    header = {
+        'benchmark_version': BENCHMARK_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='checklist_benchmark_') as directory:
+        for name in args.cases:
+            results.extend(benchmark_case(name, CASES[name], directory, args.repeat, args.seed))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(header) + '\n')
+            for result in results:
+                file.write(json.dumps(result) + '\n')
+
+    print(f"Checklist benchmark v{BENCHMARK_VERSION} (Python {header['python']}, seed {args.seed}, repeat {args.repeat})")
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['case'], result['operation']))
+        print(format_result(result, previous))
+        if previous is not None and result['median_seconds'] > previous['median_seconds'] * args.threshold:
+            regressions.append(result)
+
+    if regressions:
+        print(f"\n{len(regressions)} operation(s) slower than {args.threshold}x the baseline median:")
+        for result in regressions:
+            print(f"  {result['case']} {result['operation']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+# orjson is optional; the stdlib encoder is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# mkstemp creates 0600 files; atomic writes get the same mode open() would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def dumps_checklist(checklist, compact=False, default=None, accelerated=True):
+    """
+    Serialize a checklist to CKLB JSON bytes.
+
+    :param checklist: Checklist data in STIG Viewer 3 format
+    :param compact: Write without whitespace (STIG Viewer's own format) instead of indent=2
+    :param default: Optional json default= hook for non-JSON objects
+    :param accelerated: Use orjson when it is installed
+    :return: Encoded checklist as UTF-8 bytes
+    """
+    if accelerated and orjson is not None:
+        option = 0 if compact else orjson.OPT_INDENT_2
+        return orjson.dumps(checklist, default=default, option=option)
+    if compact:
+        return json.dumps(checklist, separators=(',', ':'), default=default).encode('utf-8')
+    return json.dumps(checklist, indent=2, default=default).encode('utf-8')
+
+
+def write_checklist(checklist, output_path, compact=False, default=None, accelerated=True, atomic=True):
+    """
+    Write a checklist to disk.
+
+    With orjson the document is encoded in one call; the stdlib encoder
+    streams chunks straight to the file handle. With atomic=True the data
+    goes to a temp file in the same directory which then replaces
+    output_path, so readers never see a half-written checklist.
+
+    :param checklist: Checklist data in STIG Viewer 3 format
+    :param output_path: Path of the .cklb file to write
+    :param compact: Write without whitespace instead of indent=2
+    :param default: Optional json default= hook for non-JSON objects
+    :param accelerated: Use orjson when it is installed
+    :param atomic: Write to a temp file and rename it over output_path
+    :return: Number of bytes written
+    """
+    if atomic:
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, write_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(output_path)}.", suffix='.tmp')
+        os.chmod(write_path, FILE_MODE)
+        file = os.fdopen(fd, 'wb')
+    else:
+        write_path = output_path
+        file = open(output_path, 'wb')
+
+    try:
+        with file:
+            if accelerated and orjson is not None:
+                file.write(dumps_checklist(checklist, compact, default))
+            else:
+                # json.dump streams the encoder's chunks instead of building the whole document
+                text = io.TextIOWrapper(file, encoding='utf-8')
+                if compact:
+                    json.dump(checklist, text, separators=(',', ':'), default=default)
+                else:
+                    json.dump(checklist, text, indent=2, default=default)
+                text.flush()
+                text.detach()
+            bytes_written = file.tell()
+        if atomic:
+            os.replace(write_path, output_path)
+    except BaseException:
+        if atomic and os.path.exists(write_path):
+            os.remove(write_path)
+        raise
+
+    return bytes_written
+
+
+def checklist_hash(checklist, default=None):
+    """
+    Canonical content hash of a checklist.
+
+    Keys are sorted and whitespace removed so the hash only changes when
+    the checklist content does, whatever encoder or indent wrote the file.
+
+    :param checklist: Checklist data in STIG Viewer 3 format
+    :param default: Optional json default= hook for non-JSON objects
+    :return: Hex SHA-256 digest
+    """
+    canonical = json.dumps(checklist, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultsManifest:
+    """
+    Record of the last checklist written for each server/database.
+
+    write_if_changed() hashes the new checklist and compares it with the
+    previous run's output for the same key. Unchanged checklists are not
+    rewritten; the manifest records the decision and points at the file
+    that already holds the content.
+
+    reuse_if_fingerprint() goes one step earlier: when the evidence
+    fingerprint stored with the previous checklist matches, the scan can
+    skip collecting evidence and building the checklist altogether.
+
+    Entries look like:
+        {"server/database": {"hash": ..., "path": ..., "status": "written" | "unchanged" | "linked" | "copied",
+                             "bytes": ..., "fingerprint": ..., "written_at": ..., "checked_at": ...}}
+    """
+
+    # What to do with an unchanged checklist: write it anyway, skip it, or hard link the previous file
+    UNCHANGED_MODES = ('write', 'skip', 'link')
+
+    def __init__(self, manifest_path, unchanged='skip'):
+        if unchanged not in self.UNCHANGED_MODES:
+            raise ValueError(f"Invalid unchanged mode: {unchanged}. Must be one of {self.UNCHANGED_MODES}")
+        self.path = manifest_path
+        self.unchanged = unchanged
+        self._lock = threading.Lock()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as file:
+                self.entries = json.load(file)
+        else:
+            self.entries = {}
+
+    def reuse_if_fingerprint(self, key, fingerprint, output_path):
+        """
+        Reuse the previous checklist for key if it was built from the same evidence.
+
+        The previous file is kept as-is ('skip'), hard linked ('link') or
+        copied ('write') to output_path, following the unchanged mode.
+
+        :param key: Stable identifier for the target, e.g. "server/database"
+        :param fingerprint: Evidence fingerprint of the current scan
+        :param output_path: Path the new checklist would be written to
+        :return: Manifest entry recorded for key, or None when the checklist must be rebuilt
+        """
+        checked_at = datetime.now().isoformat(timespec='seconds')
+
+        with self._lock:
+            previous = self.entries.get(key)
+        if previous is None or previous.get('fingerprint') != fingerprint or not os.path.exists(previous['path']):
+            return None
+
+        entry = {**previous, 'status': 'unchanged', 'checked_at': checked_at}
+        if previous['path'] != output_path and self.unchanged == 'link':
+            try:
+                os.link(previous['path'], output_path)
+                entry = {**previous, 'status': 'linked', 'link_path': output_path, 'checked_at': checked_at}
+            except OSError:
+                # Same fallback as write_if_changed(): leave the previous file where it is
+                pass
+        elif previous['path'] != output_path and self.unchanged == 'write':
+            shutil.copyfile(previous['path'], output_path)
+            entry = {**previous, 'status': 'copied', 'link_path': output_path, 'checked_at': checked_at}
+
+        with self._lock:
+            self.entries[key] = entry
+        return entry
+
+    def write_if_changed(self, key, checklist, output_path, compact=False, default=None, fingerprint=None):
+        """
+        Write a checklist unless the previous output for key has the same content.
+
+        :param key: Stable identifier for the target, e.g. "server/database"
+        :param checklist: Checklist data in STIG Viewer 3 format
+        :param output_path: Path of the .cklb file to write
+        :param compact: Write without indentation
+        :param default: Optional json default= hook for non-JSON objects
+        :param fingerprint: Evidence fingerprint the checklist was built from, for reuse_if_fingerprint()
+        :return: Manifest entry recorded for key
+        """
+        content_hash = checklist_hash(checklist, default)
+        checked_at = datetime.now().isoformat(timespec='seconds')
+
+        with self._lock:
+            previous = self.entries.get(key)
+
+        unchanged = (
+            self.unchanged != 'write'
+            and previous is not None
+            and previous['hash'] == content_hash
+            and os.path.exists(previous['path'])
+        )
+
+        if unchanged and self.unchanged == 'link' and previous['path'] != output_path:
+            try:
+                os.link(previous['path'], output_path)
+                entry = {**previous, 'status': 'linked', 'link_path': output_path, 'checked_at': checked_at}
+            except OSError:
+                # File shares without hard link support fall back to skipping the write
+                entry = {**previous, 'status': 'unchanged', 'checked_at': checked_at}
+        elif unchanged:
+            entry = {**previous, 'status': 'unchanged', 'checked_at': checked_at}
+        else:
+            bytes_written = write_checklist(checklist, output_path, compact=compact, default=default)
+            entry = {
+                'hash': content_hash,
+                'path': output_path,
+                'status': 'written',
+                'bytes': bytes_written,
+                'written_at': checked_at,
+                'checked_at': checked_at
+            }
+
+        if fingerprint is not None:
+            entry['fingerprint'] = fingerprint
+        with self._lock:
+            self.entries[key] = entry
+        return entry
+
+    def record(self, key, entry):
+        """Store an entry produced elsewhere, e.g. by a manifest copy in a worker process."""
+        with self._lock:
+            self.entries[key] = entry
+
+    def save(self):
+        """Write the manifest to disk (atomically, like the checklists)."""
+        with self._lock:
+            write_checklist(self.entries, self.path)
@@ -0,0 +1,187 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+from checklistSession import ChecklistSession, ChecklistTemplate
+from findingDetails import DEFAULT_KEEP_LAST
+
+JOURNAL_SUFFIX = '.journal'
+
+
+def details_hash(details):
+    """Short hash of a finding_details value; replay_journal() checks it after every record."""
+    return hashlib.sha256((details or '').encode('utf-8')).hexdigest()[:16]
+
+
+class ChecklistJournal:
+    """
+    Append-only log of the rule changes a ChecklistSession makes.
+
+    The first line is a header naming the template and the checklist the
+    journal belongs to; every following line is one change record:
+        {"rule_id": ..., "stig_id": ..., "old_status": ..., "new_status": ...,
+         "details": <appended text or null>, "details_hash": ...}
+    Records written by ChecklistSession.reset_rules() also carry "reset": true;
+    their details are restored as they are instead of merged.
+
+    Records are flushed as they are written, so a journal left behind by
+    a crashed run can be replayed onto the template with replay_journal().
+    """
+
+    def __init__(self, journal_path, template_path, output_path, details_policy='append', details_keep=DEFAULT_KEEP_LAST):
+        self.path = journal_path
+        self.records = 0
+        self._file = open(journal_path, 'a', encoding='utf-8')
+        if self._file.tell() == 0:
+            # Replay has to merge details the same way the scan did
+            self._write({
+                'template': template_path,
+                'output': output_path,
+                'details_policy': details_policy,
+                'details_keep': details_keep
+            })
+
+    @classmethod
+    def for_session(cls, session, output_path):
+        """Open the sidecar journal ({output}.journal) for a session's checklist."""
+        return cls(
+            output_path + JOURNAL_SUFFIX, session.template.source_path, output_path,
+            session.details_policy, session.details_keep
+        )
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def record(self, rule_id, stig_id, old_status, new_status, details, new_details, reset=False):
+        """
+        Append one rule change.
+
+        :param details: Text appended to finding_details by this change, or None
+        :param new_details: Resulting finding_details, stored only as a hash
+        :param reset: The change restored the rule (details replace rather than merge)
+        """
+        entry = {
+            'rule_id': rule_id,
+            'stig_id': stig_id,
+            'old_status': old_status,
+            'new_status': new_status,
+            'details': details,
+            'details_hash': details_hash(new_details)
+        }
+        if reset:
+            entry['reset'] = True
+        self._write(entry)
+        self.records += 1
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        """Close and delete the journal once its changes are in the saved checklist."""
+        self.close()
+        os.remove(self.path)
+
+
+def read_journal(journal_path):
+    """
+    Read a journal file.
+
+    A torn last line (the run died mid-write) is ignored.
+
+    :return: (header, list of change records)
+    """
+    with open(journal_path, 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            break
+    if not entries:
+        raise ValueError(f"Journal {journal_path} has no header")
+    return entries[0], entries[1:]
+
+
+def replay_journal(journal_path, template=None):
+    """
+    Rebuild a checklist session from a journal.
+
+    Every record stores a hash of the finding_details it produced; the
+    replayed rule must hash the same, otherwise the journal is corrupt or
+    belongs to a different template and replay stops.
+
+    :param journal_path: Path of the .journal file
+    :param template: Optional ChecklistTemplate; loaded from the header when omitted
+    :return: (ChecklistSession with the journal applied, output path from the header)
+    :raises ValueError: If a record does not match the template or reproduce its details hash
+    """
+    header, records = read_journal(journal_path)
+    if template is None:
+        template = ChecklistTemplate.load(header['template'])
+    session = ChecklistSession(
+        template,
+        details_policy=header.get('details_policy', 'append'),
+        details_keep=header.get('details_keep', DEFAULT_KEEP_LAST)
+    )
+    for number, record in enumerate(records, start=1):
+        positions = session.apply_journal_record(record)
+        if not positions:
+            raise ValueError(f"Journal {journal_path} record {number}: rule {record['rule_id']} is not in the template")
+        for position in positions:
+            if details_hash(session.rule(position).get('finding_details', '')) != record['details_hash']:
+                raise ValueError(f"Journal {journal_path} record {number}: finding details for {record['rule_id']} do not match the journaled hash")
+    return session, header['output']
+
+
+def compact_journal(journal_path, template=None, compact=False):
+    """
+    Fold a journal into its checklist: replay it, write the .cklb once and delete the journal.
+
+    :return: Path of the written checklist
+    """
+    session, output_path = replay_journal(journal_path, template)
+    session.save(output_path, compact=compact)
+    os.remove(journal_path)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compact checklist journals left behind by an interrupted checkStig run'
+    )
+    parser.add_argument(
+        'journals',
+        nargs='*',
+        help='Journal files to compact (default: every *.journal under ./results, including per-environment folders)'
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Write checklists without indentation'
+    )
+    args = parser.parse_args()
+
+    journals = args.journals or sorted(glob.glob(os.path.join('./results', '**', '*' + JOURNAL_SUFFIX), recursive=True))
+    if not journals:
+        print("No journals to compact")
+
+    # Journals from one run share a template; parse each template once
+    templates = {}
+    for journal_path in journals:
+        try:
+            header, _ = read_journal(journal_path)
+            if header['template'] not in templates:
+                templates[header['template']] = ChecklistTemplate.load(header['template'])
+            output_path = compact_journal(journal_path, templates[header['template']], compact=args.compact)
+            print(f"Compacted {journal_path} into {output_path}")
+        except Exception as e:
+            print(f"Error compacting {journal_path}: {str(e)}")
+            continue
+
+
+if __name__ == "__main__":
+    main()
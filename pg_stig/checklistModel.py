@@ -0,0 +1,215 @@
+import json
+from collections.abc import Mapping
+from enum import Enum
+
+
+class Status(str, Enum):
+    NOT_REVIEWED = 'not_reviewed'
+    NOT_APPLICABLE = 'not_applicable'
+    OPEN = 'open'
+    NOT_A_FINDING = 'not_a_finding'
+
+
+class Severity(str, Enum):
+    LOW = 'low'
+    MEDIUM = 'medium'
+    HIGH = 'high'
+    UNKNOWN = 'unknown'
+
+
+# Key orders seen while loading; every record with the same key order shares one tuple
+_KEY_ORDERS = {}
+
+
+def _shared_order(keys):
+    keys = tuple(keys)
+    return _KEY_ORDERS.setdefault(keys, keys)
+
+
+def _pooled(value, pool):
+    # Template text (discussion, check_content, fix_text, ...) is identical across every
+    # checklist built from the same STIG; a pool shared by several loads keeps one copy
+    if pool is None:
+        return value
+    if isinstance(value, str):
+        return pool.setdefault(value, value)
+    if isinstance(value, (list, dict)) and value:
+        # Nested template values (group_tree, ccis, check_content_ref, ...) are pooled by
+        # type and JSON text, so they never collide with a string of the same text ('[]');
+        # treat them as read-only
+        return pool.setdefault((type(value), json.dumps(value)), value)
+    return value
+
+
+def _to_enum(enum_cls, value):
+    # Values outside the schema are kept as-is so the round trip stays lossless
+    try:
+        return enum_cls(value)
+    except ValueError:
+        return value
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, _Record):
+        return value.to_dict()
+    return value
+
+
+class _Record(Mapping):
+    """
+    Slotted record for one object of the CKLB JSON schema.
+
+    Known keys live in __slots__, unknown keys in _extra, and _order keeps
+    the original key order so to_dict() reproduces the source document.
+    Records support Mapping access and item assignment (enum values read
+    back as plain strings) so code written against the json.load dicts
+    keeps working.
+    """
+
+    __slots__ = ('_order', '_extra')
+    FIELDS = ()
+    _FIELD_SET = frozenset()
+
+    @classmethod
+    def from_dict(cls, data, pool=None):
+        record = cls.__new__(cls)
+        extra = None
+        for key, value in data.items():
+            if key in cls._FIELD_SET:
+                object.__setattr__(record, key, record._convert(key, value, pool))
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        record._order = _shared_order(data)
+        record._extra = extra
+        return record
+
+    def _convert(self, key, value, pool=None):
+        return value
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return value.value if isinstance(value, Enum) else value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._order:
+            self._order = _shared_order(self._order + (key,))
+        if key in self._FIELD_SET:
+            object.__setattr__(self, key, self._convert(key, value))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def to_dict(self):
+        """
+        Convert back to the CKLB JSON structure, keys in their original order.
+
+        :return: Dictionary equal to the one the record was loaded from
+        """
+        data = {}
+        for key in self._order:
+            if key in self._FIELD_SET:
+                value = getattr(self, key)
+                if isinstance(value, list):
+                    data[key] = [_plain(item) for item in value]
+                else:
+                    data[key] = _plain(value)
+            else:
+                data[key] = self._extra[key]
+        return data
+
+
+class Rule(_Record):
+    FIELDS = (
+        'group_id_src', 'group_tree', 'group_id', 'severity', 'group_title',
+        'rule_id_src', 'rule_id', 'rule_version', 'rule_title', 'fix_text',
+        'weight', 'check_content', 'check_content_ref', 'classification',
+        'discussion', 'false_positives', 'false_negatives', 'documentable',
+        'security_override_guidance', 'potential_impacts', 'third_party_tools',
+        'ia_controls', 'responsibility', 'mitigations', 'mitigation_control',
+        'legacy_ids', 'ccis', 'reference_identifier', 'uuid', 'stig_uuid',
+        'status', 'overrides', 'comments', 'finding_details'
+    )
+    __slots__ = FIELDS
+    _FIELD_SET = frozenset(FIELDS)
+
+    # Text that comes from the STIG itself and repeats across checklists; per-rule IDs
+    # and per-target results (status, comments, finding_details, ...) are never pooled
+    POOLED_FIELDS = frozenset((
+        'group_tree', 'group_title', 'rule_title', 'fix_text', 'weight', 'check_content',
+        'check_content_ref', 'classification', 'discussion', 'false_positives', 'false_negatives',
+        'documentable', 'security_override_guidance', 'potential_impacts', 'third_party_tools',
+        'ia_controls', 'responsibility', 'mitigations', 'mitigation_control', 'legacy_ids',
+        'ccis', 'reference_identifier', 'stig_uuid'
+    ))
+
+    def _convert(self, key, value, pool=None):
+        if key == 'status':
+            return _to_enum(Status, value)
+        if key == 'severity':
+            return _to_enum(Severity, value)
+        if key in self.POOLED_FIELDS:
+            return _pooled(value, pool)
+        return value
+
+
+class Stig(_Record):
+    FIELDS = (
+        'stig_name', 'display_name', 'stig_id', 'release_info', 'uuid',
+        'reference_identifier', 'size', 'rules'
+    )
+    __slots__ = FIELDS
+    _FIELD_SET = frozenset(FIELDS)
+
+    def _convert(self, key, value, pool=None):
+        if key == 'rules':
+            return [Rule.from_dict(rule, pool) for rule in value]
+        return _pooled(value, pool)
+
+
+class Checklist(_Record):
+    FIELDS = ('title', 'id', 'stigs', 'active', 'mode', 'has_path', 'target_data')
+    __slots__ = FIELDS
+    _FIELD_SET = frozenset(FIELDS)
+
+    def _convert(self, key, value, pool=None):
+        if key == 'stigs':
+            return [Stig.from_dict(stig, pool) for stig in value]
+        return value
+
+
+def load_checklist(checklist_path, text_pool=None):
+    """
+    Load a STIG Viewer 3 checklist into the compact record model.
+
+    :param checklist_path: Path to the STIG Viewer checklist JSON file
+    :param text_pool: Dictionary shared by several loads so checklists from the same
+        STIG keep one copy of the template text; by default each load has its own
+    :return: Checklist
+    """
+    with open(checklist_path, 'r', encoding='utf-8') as file:
+        return Checklist.from_dict(json.load(file), {} if text_pool is None else text_pool)
+
+
+def to_json(value):
+    """json.dump default= hook that serializes records back to CKLB JSON."""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
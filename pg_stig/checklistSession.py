@@ -0,0 +1,484 @@
+import json
+import re
+from functools import cached_property
+
+from checklistIO import checklist_hash, write_checklist
+from checklistModel import load_checklist, to_json
+from findingDetails import DEFAULT_KEEP_LAST, DETAILS_POLICIES, DetailsMerger
+
+# Valid status and severity options based on the JSON schema
+VALID_STATUSES = ['not_reviewed', 'not_applicable', 'open', 'not_a_finding']
+VALID_SEVERITIES = ['low', 'medium', 'high', 'unknown']
+
+# SV-214050r961683 / SV-214050r961683_rule -> SV-214050
+RULE_REF_PATTERN = re.compile(r'^([A-Z]+-\d+)r\d+(?:_rule)?$')
+
+# Finding details longer than this are cut short in the update log
+LOG_DETAILS_CHARS = 200
+
+
+def base_rule_id(rule_ref):
+    """
+    Strip the revision suffix from a rule reference.
+
+    'SV-214050r961683' and 'SV-214050r961683_rule' both become 'SV-214050'.
+    References that do not follow the DISA pattern (group IDs such as
+    'V-214050', or custom IDs) are returned unchanged.
+    """
+    match = RULE_REF_PATTERN.match(rule_ref)
+    return match.group(1) if match else rule_ref
+
+
+def _details_summary(details):
+    # Evidence can run to megabytes; the update log only keeps its start and length
+    if len(details) <= LOG_DETAILS_CHARS:
+        return details
+    return f"{details[:LOG_DETAILS_CHARS]}... ({len(details)} chars)"
+
+
+class RuleIndex:
+    """
+    Hash index of the rules in a checklist, keyed by (stig_id, rule key).
+
+    Every rule is reachable by its full rule_id, its base vuln ID (the
+    rule_id without the revision suffix) and its group_id, so updates
+    written against an older STIG release still resolve in O(1).
+    by_severity buckets rules by severity for bulk status changes.
+
+    Rules are stored as positions (stig position, rule position) so one
+    index can be shared by every session built on the same template.
+    """
+
+    def __init__(self, checklist):
+        self.by_key = {}
+        self.stigs_by_key = {}
+        self.by_severity = {}
+        for stig_pos, stig in enumerate(checklist.get('stigs', [])):
+            for rule_pos, rule in enumerate(stig.get('rules', [])):
+                self.by_severity.setdefault(rule.get('severity'), []).append((stig_pos, rule_pos))
+                keys = {rule['rule_id'], base_rule_id(rule['rule_id']), rule.get('group_id')}
+                keys.discard(None)
+                for key in keys:
+                    self.by_key[(stig['stig_id'], key)] = (stig_pos, rule_pos)
+                    self.stigs_by_key.setdefault(key, []).append(stig['stig_id'])
+
+    def lookup(self, rule_ref, stig_id=None):
+        """
+        Find the rules an update applies to.
+
+        :param rule_ref: Full rule ID, base vuln ID (SV-214050) or group ID (V-214050)
+        :param stig_id: Optional STIG identifier; None matches the rule in every STIG
+        :return: List of (stig_id, position) pairs
+        """
+        key = base_rule_id(rule_ref)
+        stig_ids = [stig_id] if stig_id is not None else self.stigs_by_key.get(key, [])
+        matches = []
+        for candidate in stig_ids:
+            position = self.by_key.get((candidate, key))
+            if position is not None:
+                matches.append((candidate, position))
+        return matches
+
+
+class ChecklistTemplate:
+    """
+    Parsed checklist used as the immutable base for ChecklistSession.
+
+    Parse the template once per run and build one session per database
+    from it; sessions never modify the template. The checklist can be the
+    json.load dictionaries or the compact checklistModel.Checklist.
+    """
+
+    def __init__(self, checklist, source_path=None):
+        self.checklist = checklist
+        self.source_path = source_path
+        self.rule_index = RuleIndex(checklist)
+
+    @classmethod
+    def load(cls, checklist_path, compact=False):
+        """
+        Load a checklist template from disk.
+
+        :param checklist_path: Path to the STIG Viewer checklist JSON file
+        :param compact: Load into the slotted checklistModel records instead of dictionaries
+        :return: ChecklistTemplate for the loaded checklist
+        """
+        if compact:
+            return cls(load_checklist(checklist_path), checklist_path)
+        with open(checklist_path, 'r') as file:
+            checklist = json.load(file)
+        return cls(checklist, checklist_path)
+
+    @cached_property
+    def content_hash(self):
+        """Content hash of the template; part of every evidence fingerprint built on it."""
+        return checklist_hash(self.checklist, to_json)
+
+    def rule(self, position):
+        stig_pos, rule_pos = position
+        return self.checklist['stigs'][stig_pos]['rules'][rule_pos]
+
+
+class ChecklistSession:
+    """
+    In-memory STIG Viewer 3 checklist built on a ChecklistTemplate.
+
+    The session is an overlay: it only stores copies of the rules it
+    changed, every check applies its results to that overlay, and the
+    full document is materialized once when save() writes it.
+    """
+
+    def __init__(self, template, source_path=None, details_policy='append', details_keep=DEFAULT_KEEP_LAST):
+        if details_policy not in DETAILS_POLICIES:
+            raise ValueError(f"Invalid details policy: {details_policy}. Must be one of {DETAILS_POLICIES}")
+        self.template = template
+        self.details_policy = details_policy
+        self.details_keep = details_keep
+        self.details_merger = DetailsMerger(details_policy, details_keep)
+        self.source_path = source_path or template.source_path
+        self.rule_index = template.rule_index
+        self.changed_rules = {}
+        self.changes_made = False
+        self.unmatched_updates = []
+        # Optional checklistJournal.ChecklistJournal that receives every rule change
+        self.journal = None
+
+    @classmethod
+    def load(cls, checklist_path, compact=False, **kwargs):
+        """
+        Load a checklist from disk.
+
+        :param checklist_path: Path to the STIG Viewer checklist JSON file
+        :param compact: Load into the slotted checklistModel records instead of dictionaries
+        :param kwargs: details_policy / details_keep for the session
+        :return: ChecklistSession for the loaded checklist
+        """
+        return cls(ChecklistTemplate.load(checklist_path, compact), checklist_path, **kwargs)
+
+    def merge_details(self, position, original_details, new_details):
+        """Combine a rule's details with new details using the session's details policy (see findingDetails.DetailsMerger)."""
+        return self.details_merger.merge(position, original_details, new_details)
+
+    def rule(self, position):
+        """Current state of the rule at position, changed or from the template."""
+        rule = self.changed_rules.get(position)
+        return rule if rule is not None else self.template.rule(position)
+
+    def _writable_rule(self, position):
+        # Copy-on-write: the template rule is copied the first time it changes
+        rule = self.changed_rules.get(position)
+        if rule is None:
+            rule = dict(self.template.rule(position))
+            self.changed_rules[position] = rule
+        return rule
+
+    @property
+    def checklist(self):
+        """Full checklist document with the session's changes applied."""
+        return self.materialize()
+
+    def materialize(self):
+        """
+        Build the full checklist document.
+
+        Unchanged rules and all other fields are shared with the template,
+        so this only allocates the containers that hold the changed rules.
+
+        :return: Checklist data in STIG Viewer 3 format
+        """
+        base = self.template.checklist
+        if not self.changed_rules:
+            return base
+
+        stigs = []
+        for stig_pos, stig in enumerate(base.get('stigs', [])):
+            rules = [
+                self.changed_rules.get((stig_pos, rule_pos), rule)
+                for rule_pos, rule in enumerate(stig.get('rules', []))
+            ]
+            stigs.append({**stig, 'rules': rules})
+        return {**base, 'stigs': stigs}
+
+    ### - update details and status for specific rules, matched by rule ID, base vuln ID or group ID
+    def update_stig_findings(self, update_rules):
+        """
+        Update finding details and status for specific rules in the loaded checklist.
+
+        :param update_rules: List of dictionaries with rule update information
+            Each dictionary should contain:
+            - 'rule_id': The rule to update; a full rule ID from any STIG release,
+              a base vuln ID (SV-214050) or a group ID (V-214050)
+            - 'stig_id': Optional STIG identifier for precise matching
+            - 'finding_details': Optional new finding details text
+            - 'status': Optional new status (not_reviewed, not_applicable, open, not_a_finding)
+
+        :return: This session
+        """
+        # Track update details for logging
+        updated_rules = []
+
+        for update in update_rules:
+            # Find rules matching the update criteria
+            matches = self.rule_index.lookup(update['rule_id'], update.get('stig_id'))
+            if not matches:
+                self.unmatched_updates.append(update)
+
+            for stig_id, position in matches:
+                rule = self._writable_rule(position)
+                original_status = rule.get('status', 'not_reviewed')
+                original_details = rule.get('finding_details', '')
+
+                # Update finding details if provided
+                if 'finding_details' in update:
+                    rule['finding_details'] = self.merge_details(position, original_details, update['finding_details'])
+                    if rule['finding_details'] != original_details:
+                        self.changes_made = True
+
+                # Update status if provided and valid
+                if 'status' in update:
+                    if update['status'] not in VALID_STATUSES:
+                        raise ValueError(f"Invalid status: {update['status']}. Must be one of {VALID_STATUSES}")
+
+                    rule['status'] = update['status']
+                    self.changes_made = True
+
+                if self.journal is not None:
+                    self.journal.record(
+                        rule['rule_id'], stig_id, original_status, rule.get('status'),
+                        update.get('finding_details'), rule.get('finding_details', '')
+                    )
+
+                # Track which rules were updated
+                updated_rules.append({
+                    'rule_id': rule['rule_id'],
+                    'stig_id': stig_id,
+                    'original_status': original_status,
+                    'new_status': rule.get('status'),
+                    'original_details': _details_summary(original_details),
+                    'new_details': _details_summary(rule.get('finding_details', ''))
+                })
+
+        if updated_rules:
+            # Print detailed update log
+            print("\nUpdated Rules:")
+            for update in updated_rules:
+                print(f"Rule ID: {update['rule_id']} (STIG: {update['stig_id']})")
+                print(f"  Status: {update['original_status']} → {update['new_status']}")
+                print(f"  Details: {update['original_details']} → {update['new_details']}\n")
+                print()
+        else:
+            print("No matching rules found. No updates made.")
+
+        return self
+
+    def reset_rules(self, rule_refs, base):
+        """
+        Put rules back to their status and finding_details in another template.
+
+        A partial re-check starts from the previous checklist; resetting the
+        rules it re-checks keeps their old evidence and status from being
+        merged into the new results.
+
+        :param rule_refs: Rule references, as for update_stig_findings()
+        :param base: ChecklistTemplate holding the state to restore, e.g. the empty template
+        :return: This session
+        """
+        for rule_ref in rule_refs:
+            for stig_id, position in self.rule_index.lookup(rule_ref):
+                rule = self._writable_rule(position)
+                matches = base.rule_index.lookup(rule['rule_id'], stig_id)
+                original = base.rule(matches[0][1]) if matches else {}
+                original_status = rule.get('status', 'not_reviewed')
+                rule['status'] = original.get('status', 'not_reviewed')
+                rule['finding_details'] = original.get('finding_details', '')
+                self.changes_made = True
+
+                if self.journal is not None:
+                    self.journal.record(
+                        rule['rule_id'], stig_id, original_status, rule['status'],
+                        rule['finding_details'], rule['finding_details'], reset=True
+                    )
+        return self
+
+    def apply_journal_record(self, record):
+        """
+        Re-apply one change record written by a ChecklistJournal.
+
+        :param record: Journal record (rule_id, stig_id, new_status, details)
+        :return: Positions of the rules the record was applied to
+        """
+        positions = []
+        for stig_id, position in self.rule_index.lookup(record['rule_id'], record['stig_id']):
+            rule = self._writable_rule(position)
+            if record.get('reset'):
+                # reset_rules(): details are restored as they are, not merged
+                rule['finding_details'] = record.get('details') or ''
+            elif record.get('details') is not None:
+                rule['finding_details'] = self.merge_details(position, rule.get('finding_details', ''), record['details'])
+            if record.get('new_status') is not None:
+                rule['status'] = record['new_status']
+            self.changes_made = True
+            positions.append(position)
+        return positions
+
+    def report_unmatched(self):
+        """
+        Print every update that did not resolve to a rule in this checklist.
+
+        :return: List of rule references that were not matched
+        """
+        unmatched = [update['rule_id'] for update in self.unmatched_updates]
+        if unmatched:
+            print(f"\n{len(unmatched)} update(s) did not match any rule in the checklist:")
+            for rule_ref in dict.fromkeys(unmatched):
+                print(f"  {rule_ref}")
+        return unmatched
+
+    ### -------------- UPDATE FINDING STATUS IN BULK BY SEVERITY
+    def update_findings_by_severity(self, severity_updates):
+        """
+        Update finding status for all rules matching specified severity levels.
+
+        :param severity_updates: List of dictionaries with severity update rules
+            Each dictionary should contain:
+            - 'severity': Severity level to match (low, medium, high, unknown)
+            - 'status': New status to apply to matching rules
+            - 'finding_details': Optional finding details to add
+
+        :return: This session
+        """
+        # Validate input
+        for update in severity_updates:
+            if update['severity'] not in VALID_SEVERITIES:
+                raise ValueError(f"Invalid severity: {update['severity']}. Must be one of {VALID_SEVERITIES}")
+            if update['status'] not in VALID_STATUSES:
+                raise ValueError(f"Invalid status: {update['status']}. Must be one of {VALID_STATUSES}")
+
+        stigs = self.template.checklist.get('stigs', [])
+        updated_counts = {}
+        samples = {}
+
+        for update in severity_updates:
+            # Only the rules in the matching severity bucket are touched
+            bucket = self.rule_index.by_severity.get(update['severity'], [])
+            for position in bucket:
+                stig = stigs[position[0]]
+                rule = self._writable_rule(position)
+
+                # Store original values
+                original_status = rule.get('status', 'not_reviewed')
+                original_details = rule.get('finding_details', '')
+
+                # Update status
+                rule['status'] = update['status']
+
+                # Update finding details if provided
+                if 'finding_details' in update:
+                    rule['finding_details'] = self.merge_details(position, original_details, update['finding_details'])
+
+                if self.journal is not None:
+                    self.journal.record(
+                        rule['rule_id'], stig['stig_id'], original_status, rule['status'],
+                        update.get('finding_details'), rule.get('finding_details', '')
+                    )
+
+                # Keep up to 5 sample updates per severity for the summary
+                severity_samples = samples.setdefault(update['severity'], [])
+                if len(severity_samples) < 5:
+                    severity_samples.append({
+                        'rule_id': rule['rule_id'],
+                        'stig_id': stig['stig_id'],
+                        'original_status': original_status,
+                        'new_status': rule['status']
+                    })
+
+            if bucket:
+                self.changes_made = True
+                updated_counts[update['severity']] = updated_counts.get(update['severity'], 0) + len(bucket)
+
+        if updated_counts:
+            print("\nSeverity-based Updates Summary:")
+
+            # Print detailed summary
+            for severity, total in updated_counts.items():
+                print(f"\n{severity.upper()} Severity Rules:")
+                print(f"  Total Updated: {total}")
+                print("  Sample Updates:")
+                for update in samples[severity]:
+                    print(f"    Rule ID: {update['rule_id']}")
+                    print(f"    Status: {update['original_status']} → {update['new_status']}")
+        else:
+            print("No matching rules found. No updates made.")
+
+        return self
+
+    def severity_counts(self):
+        """
+        Number of rules per severity, read from the severity index.
+
+        :return: Dictionary of severity -> rule count
+        """
+        return {severity: len(bucket) for severity, bucket in self.rule_index.by_severity.items()}
+
+    def save(self, output_path, compact=False):
+        """
+        Write the checklist to disk in STIG Viewer 3 format.
+
+        :param output_path: Path of the .cklb file to write
+        :param compact: Write without indentation (STIG Viewer's own format)
+        :return: Number of bytes written
+        """
+        bytes_written = write_checklist(self.materialize(), output_path, compact=compact, default=to_json)
+        print(f"Updated checklist saved to {output_path}")
+        return bytes_written
+
+    def save_if_changed(self, manifest, key, output_path, compact=False, fingerprint=None):
+        """
+        Write the checklist only if it differs from the previous output recorded for key.
+
+        :param manifest: checklistIO.ResultsManifest for the results directory
+        :param key: Stable identifier for the target, e.g. "server/database"
+        :param output_path: Path of the .cklb file to write
+        :param compact: Write without indentation (STIG Viewer's own format)
+        :param fingerprint: Evidence fingerprint to store with the entry
+        :return: Manifest entry recorded for key
+        """
+        entry = manifest.write_if_changed(key, self.materialize(), output_path, compact=compact, default=to_json, fingerprint=fingerprint)
+        if entry['status'] == 'written':
+            print(f"Updated checklist saved to {output_path}")
+        else:
+            print(f"Checklist unchanged since {entry['path']}; {output_path} not written ({entry['status']})")
+        return entry
+
+
+class RecordedUpdates:
+    """
+    Checklist stand-in that records update calls instead of applying them.
+
+    A check run against a recorder once can have its results applied to any
+    number of ChecklistSessions with apply(); each session still merges
+    details, logs and journals the changes as if the check had run on it.
+    The recorded update lists are shared, so sessions must not modify them.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def update_stig_findings(self, update_rules):
+        self.calls.append(('update_stig_findings', update_rules))
+        return self
+
+    def update_findings_by_severity(self, severity_updates):
+        self.calls.append(('update_findings_by_severity', severity_updates))
+        return self
+
+    def apply(self, checklist):
+        """
+        Replay the recorded updates on a checklist, in the order they were made.
+
+        :param checklist: ChecklistSession to update
+        :return: The checklist
+        """
+        for method, updates in self.calls:
+            getattr(checklist, method)(updates)
+        return checklist
@@ -3,6 +3,8 @@ import yaml
 from typing import Dict, Any
 import os
 
+from checklistModel import Checklist, load_checklist
+
 class STIGJsonParser:
     def parse_json_cklb(self, input_file: str) -> Dict[str, Any]:
         """
@@ -18,14 +20,28 @@ class STIGJsonParser:
             data = json.load(f)
         return data
 
+    def load_checklist(self, input_file: str) -> Checklist:
+        """
+        Parse a JSON CKLB file into the compact checklist model
+        
+        Args:
+            input_file (str): Path to the JSON CKLB file
+            
+        Returns:
+            Checklist: Slotted records that round-trip to the CKLB schema via to_dict()
+        """
+        return load_checklist(input_file)
+
     def save_to_yaml(self, data: Dict[str, Any], output_file: str):
         """
         Save the STIG data to YAML format
         
         Args:
-            data (Dict[str, Any]): The STIG data to save
+            data (Dict[str, Any] | Checklist): The STIG data to save
             output_file (str): Path to save the YAML file
         """
+        if isinstance(data, Checklist):
+            data = data.to_dict()
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         with open(output_file, 'w', encoding='utf-8') as f:
             yaml.dump(data, f, default_flow_style=False, sort_keys=False)
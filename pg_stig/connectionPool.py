@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class ServerConnectionPool:
+    """
+    Pool of warm connections to the databases of one server.
+
+    Connecting to Azure PostgreSQL costs a TLS handshake and authentication,
+    so each database gets one connection that is kept open for the whole
+    scan and handed to every check and audit query against that database.
+    When more than max_size databases are open the least recently used idle
+    connection is closed. Connections are created by connect_factory, so the
+    pool works with any DB-API driver and connection string format.
+
+    Usage:
+        pool = ServerConnectionPool(lambda database: psycopg2.connect(...), max_size=8)
+        with pool.connection('postgres') as connection:
+            ...
+        pool.close_all()
+    """
+
+    def __init__(self, connect_factory, max_size=8):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self.connect_factory = connect_factory
+        self.max_size = max_size
+        self._connections = OrderedDict()
+        self._in_use = {}
+        self._lock = threading.Lock()
+        self.connects = 0
+
+    def get(self, database):
+        """
+        Warm connection to database, connecting on first use.
+
+        Prefer connection() when several threads share the pool; connections
+        returned by get() can be evicted once max_size other databases are used.
+
+        :param database: Database name
+        :return: Open DB-API connection
+        """
+        with self._lock:
+            connection = self._connections.get(database)
+            if connection is not None and getattr(connection, 'closed', 0):
+                # Dropped by the server (idle timeout, failover); reconnect below
+                del self._connections[database]
+                connection = None
+            if connection is not None:
+                self._connections.move_to_end(database)
+                return connection
+
+        # Connect outside the lock so other databases are not held up by the handshake
+        connection = self.connect_factory(database)
+
+        with self._lock:
+            existing = self._connections.get(database)
+            if existing is not None and not getattr(existing, 'closed', 0):
+                # Another thread connected first; keep its connection
+                connection.close()
+                self._connections.move_to_end(database)
+                return existing
+            self._connections[database] = connection
+            self.connects += 1
+            self._evict()
+        return connection
+
+    @contextmanager
+    def connection(self, database):
+        """
+        Borrow the connection to database; it is not evicted while borrowed.
+
+        A failed transaction is rolled back so the next borrower gets a usable connection.
+        """
+        connection = self.get(database)
+        with self._lock:
+            self._in_use[database] = self._in_use.get(database, 0) + 1
+        try:
+            yield connection
+        except Exception:
+            if not getattr(connection, 'closed', 0):
+                connection.rollback()
+            raise
+        finally:
+            with self._lock:
+                self._in_use[database] -= 1
+                if not self._in_use[database]:
+                    del self._in_use[database]
+                self._evict()
+
+    def _evict(self):
+        # Caller holds the lock. Borrowed connections are skipped, so the pool
+        # can briefly exceed max_size while every connection is in use.
+        for database in list(self._connections):
+            if len(self._connections) <= self.max_size:
+                break
+            if database in self._in_use:
+                continue
+            self._close(self._connections.pop(database))
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self, database):
+        """Close and forget the connection to one database."""
+        with self._lock:
+            connection = self._connections.pop(database, None)
+        if connection is not None:
+            self._close(connection)
+
+    def close_all(self):
+        """Close every pooled connection."""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            self._close(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close_all()
+        return False
+
+    def __len__(self):
+        return len(self._connections)
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CredentialProvider:
+    """
+    Admin passwords for the servers of one Key Vault, fetched ahead of use.
+
+    prefetch() starts a concurrent secret lookup for every server as soon as
+    the server list is known, so the fetches overlap with the rest of the
+    scan; password() waits only for the server it is asked about. Secrets
+    live in memory for the lifetime of the provider and are never written
+    anywhere; close() drops them, along with the secret results az kept
+    in memory when az is given.
+
+    :param azure: azureClient.AzureClient used for get_secret
+    :param key_vault: Key Vault holding the '{server}-pw' secrets
+    :param max_workers: Concurrent secret lookups
+    :param az: Optional azCli.AzCli behind azure's cli backend
+    """
+
+    SECRET_SUFFIX = '-pw'
+
+    def __init__(self, azure, key_vault, max_workers=8, az=None):
+        self.azure = azure
+        self.key_vault = key_vault
+        self.az = az
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='secrets')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def secret_name(self, server_name):
+        return server_name + self.SECRET_SUFFIX
+
+    def prefetch(self, server_names):
+        """Start fetching the password of every server in server_names."""
+        for server_name in server_names:
+            self._future(server_name)
+
+    def _future(self, server_name):
+        with self._lock:
+            future = self._futures.get(server_name)
+            if future is None:
+                future = self._executor.submit(self.azure.get_secret, self.key_vault, self.secret_name(server_name))
+                self._futures[server_name] = future
+            return future
+
+    def password(self, server_name):
+        """
+        Admin password of a server, waiting for its prefetch (or fetching it now).
+
+        :raises Exception: Whatever the secret lookup raised
+        """
+        return self._future(server_name).result()
+
+    def close(self):
+        """Stop outstanding lookups and forget every secret."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._futures.clear()
+        if self.az is not None:
+            self.az.forget_secrets()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
@@ -0,0 +1,302 @@
+import hashlib
+import json
+
+# Every piece of per-database evidence the checks quote, as one column each of a
+# single SELECT. Each column is a json array of row objects (keys in column order),
+# so the result sets keep their column names and psycopg2 decodes them without
+# extra queries. evidence_query() selects only the columns a run needs.
+EVIDENCE_COLUMNS = {
+    'du': r"""
+    (SELECT json_agg(r) FROM (
+        SELECT r.rolname, r.rolsuper, r.rolinherit, r.rolcreaterole, r.rolcreatedb,
+               r.rolcanlogin, r.rolconnlimit, r.rolvaliduntil, r.rolreplication, r.rolbypassrls,
+               ARRAY(SELECT b.rolname
+                     FROM pg_catalog.pg_auth_members m
+                     JOIN pg_catalog.pg_roles b ON m.roleid = b.oid
+                     WHERE m.member = r.oid
+                     ORDER BY 1) AS memberof
+        FROM pg_catalog.pg_roles r
+        WHERE r.rolname !~ '^pg_'
+        ORDER BY 1
+    ) r)""",
+    'dp': r"""
+    (SELECT json_agg(p) FROM (
+        SELECT n.nspname AS "Schema",
+               c.relname AS "Name",
+               CASE c.relkind
+                   WHEN 'r' THEN 'table' WHEN 'v' THEN 'view' WHEN 'm' THEN 'materialized view'
+                   WHEN 'S' THEN 'sequence' WHEN 'f' THEN 'foreign table' WHEN 'p' THEN 'partitioned table'
+               END AS "Type",
+               pg_catalog.array_to_string(c.relacl, E'\n') AS "Access privileges",
+               pg_catalog.array_to_string(ARRAY(
+                   SELECT a.attname || E':\n  ' || pg_catalog.array_to_string(a.attacl, E'\n  ')
+                   FROM pg_catalog.pg_attribute a
+                   WHERE a.attrelid = c.oid AND NOT a.attisdropped AND a.attacl IS NOT NULL
+               ), E'\n') AS "Column privileges",
+               pg_catalog.array_to_string(ARRAY(
+                   SELECT pol.polname
+                          || CASE WHEN pol.polcmd != '*' THEN E' (' || pol.polcmd::pg_catalog.text || E'):' ELSE E':' END
+                          || CASE WHEN pol.polqual IS NOT NULL THEN E'\n  (u): ' || pg_catalog.pg_get_expr(pol.polqual, pol.polrelid) ELSE E'' END
+                          || CASE WHEN pol.polwithcheck IS NOT NULL THEN E'\n  (c): ' || pg_catalog.pg_get_expr(pol.polwithcheck, pol.polrelid) ELSE E'' END
+                          || CASE WHEN pol.polroles <> '{0}' THEN E'\n  to: ' || pg_catalog.array_to_string(ARRAY(
+                                 SELECT rolname FROM pg_catalog.pg_roles WHERE oid = ANY (pol.polroles) ORDER BY 1
+                             ), E', ') ELSE E'' END
+                   FROM pg_catalog.pg_policy pol
+                   WHERE pol.polrelid = c.oid
+               ), E'\n') AS "Policies"
+        FROM pg_catalog.pg_class c
+        LEFT JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'v', 'm', 'S', 'f', 'p')
+          AND n.nspname !~ '^pg_'
+          AND pg_catalog.pg_table_is_visible(c.oid)
+        ORDER BY 1, 2
+    ) p)""",
+    'extensions': r"""
+    (SELECT json_agg(e) FROM (SELECT * FROM pg_catalog.pg_extension) e)""",
+    'password_encryption': r"""
+    pg_catalog.current_setting('password_encryption')""",
+    'pgcrypto': r"""
+    (SELECT json_agg(a) FROM (
+        SELECT * FROM pg_catalog.pg_available_extensions WHERE name = 'pgcrypto'
+    ) a)""",
+}
+
+EVIDENCE_KEYS = tuple(EVIDENCE_COLUMNS)
+
+
+def evidence_query(keys=EVIDENCE_KEYS):
+    """
+    SELECT returning the requested evidence columns in one round trip.
+
+    :param keys: Subset of EVIDENCE_KEYS
+    :return: SQL text
+    """
+    # Each column expression starts on its own line
+    columns = ','.join(f'{EVIDENCE_COLUMNS[key]} AS {key}' for key in keys)
+    return f'SELECT{columns};\n'
+
+
+EVIDENCE_QUERY = evidence_query()
+
+# Cheap stand-in for EVIDENCE_QUERY: md5 digests of the same catalog data, computed
+# server-side, so an unchanged database can be recognised without rendering anything
+FINGERPRINT_QUERY = r"""
+SELECT
+    pg_catalog.current_setting('server_version') AS server_version,
+    (SELECT pg_catalog.md5(COALESCE(pg_catalog.string_agg(pg_catalog.concat_ws('|',
+                r.rolname, r.rolsuper, r.rolinherit, r.rolcreaterole, r.rolcreatedb, r.rolcanlogin,
+                r.rolconnlimit, r.rolvaliduntil, r.rolreplication, r.rolbypassrls,
+                ARRAY(SELECT m.roleid FROM pg_catalog.pg_auth_members m WHERE m.member = r.oid ORDER BY 1)
+            ), ',' ORDER BY r.rolname), ''))
+     FROM pg_catalog.pg_roles r
+     WHERE r.rolname !~ '^pg_') AS roles,
+    (SELECT pg_catalog.md5(COALESCE(pg_catalog.string_agg(pg_catalog.concat_ws('|',
+                n.nspname, c.relname, c.relkind, c.relacl,
+                ARRAY(SELECT a.attname || a.attacl::pg_catalog.text FROM pg_catalog.pg_attribute a
+                      WHERE a.attrelid = c.oid AND NOT a.attisdropped AND a.attacl IS NOT NULL ORDER BY a.attnum),
+                ARRAY(SELECT pg_catalog.concat_ws(':', pol.polname, pol.polcmd, pol.polroles, pol.polqual, pol.polwithcheck)
+                      FROM pg_catalog.pg_policy pol WHERE pol.polrelid = c.oid ORDER BY pol.polname)
+            ), ',' ORDER BY n.nspname, c.relname), ''))
+     FROM pg_catalog.pg_class c
+     LEFT JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+     WHERE c.relkind IN ('r', 'v', 'm', 'S', 'f', 'p')
+       AND n.nspname !~ '^pg_'
+       AND pg_catalog.pg_table_is_visible(c.oid)) AS acls,
+    (SELECT pg_catalog.md5(COALESCE(pg_catalog.string_agg(e::pg_catalog.text, ',' ORDER BY e.extname), ''))
+     FROM (SELECT * FROM pg_catalog.pg_extension) e) AS extensions,
+    pg_catalog.current_setting('password_encryption') AS password_encryption,
+    (SELECT a::pg_catalog.text
+     FROM (SELECT * FROM pg_catalog.pg_available_extensions WHERE name = 'pgcrypto') a) AS pgcrypto;
+"""
+
+FINGERPRINT_COLUMNS = ('server_version', 'roles', 'acls', 'extensions', 'password_encryption', 'pgcrypto')
+
+DU_COLUMNS = ['Role name', 'Attributes', 'Member of']
+DP_COLUMNS = ['Schema', 'Name', 'Type', 'Access privileges', 'Column privileges', 'Policies']
+EXTENSION_COLUMNS = ['oid', 'extname', 'extowner', 'extnamespace', 'extrelocatable', 'extversion', 'extconfig', 'extcondition']
+AVAILABLE_EXTENSION_COLUMNS = ['name', 'default_version', 'installed_version', 'comment']
+
+
+def _cell(value):
+    # psql text output: booleans as t/f, NULL as empty, arrays as {a,b}
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{' + ','.join(_cell(item) for item in value) + '}'
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+
+def render_table(columns, rows, title=None, footer=True):
+    """
+    Render rows the way psql's default aligned output does.
+
+    Multi-line cells are continued with '+' like psql, numbers are right
+    aligned and everything else left aligned.
+
+    :param columns: Column headers
+    :param rows: List of rows, each a list of values in column order
+    :param title: Optional title centred above the table (psql describe commands)
+    :param footer: Add the "(N rows)" footer printed for plain queries
+    :return: Table text
+    """
+    numeric = [
+        bool(rows) and all(isinstance(row[i], (int, float)) and not isinstance(row[i], bool) for row in rows if row[i] is not None)
+        and any(row[i] is not None for row in rows)
+        for i in range(len(columns))
+    ]
+    cells = [[_cell(value).split('\n') for value in row] for row in rows]
+    widths = [
+        max([len(column)] + [len(line) for row in cells for line in row[i]])
+        for i, column in enumerate(columns)
+    ]
+    total_width = sum(widths) + 3 * len(widths) - 1
+
+    lines = []
+    if title:
+        lines.append(title.center(total_width).rstrip())
+    lines.append('|'.join(f" {column.center(width)} " for column, width in zip(columns, widths)))
+    lines.append('+'.join('-' * (width + 2) for width in widths))
+
+    for row in cells:
+        height = max(len(cell) for cell in row)
+        for index in range(height):
+            parts = []
+            for i, cell in enumerate(row):
+                text = cell[index] if index < len(cell) else ''
+                text = text.rjust(widths[i]) if numeric[i] else text.ljust(widths[i])
+                marker = '+' if index < len(cell) - 1 else ' '
+                parts.append(f" {text}{marker}")
+            lines.append('|'.join(parts).rstrip())
+
+    if footer:
+        lines.append(f"({len(rows)} row{'' if len(rows) == 1 else 's'})")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _role_attributes(role):
+    # Same wording and order as psql's \du
+    attributes = []
+    if role['rolsuper']:
+        attributes.append('Superuser')
+    if not role['rolinherit']:
+        attributes.append('No inheritance')
+    if role['rolcreaterole']:
+        attributes.append('Create role')
+    if role['rolcreatedb']:
+        attributes.append('Create DB')
+    if not role['rolcanlogin']:
+        attributes.append('Cannot login')
+    if role['rolreplication']:
+        attributes.append('Replication')
+    if role['rolbypassrls']:
+        attributes.append('Bypass RLS')
+    if role['rolconnlimit'] >= 0:
+        if role['rolconnlimit'] == 0:
+            attributes.append('No connections')
+        else:
+            attributes.append(f"{role['rolconnlimit']} connection{'' if role['rolconnlimit'] == 1 else 's'}")
+    if role['rolvaliduntil']:
+        attributes.append(f"Password valid until {role['rolvaliduntil']}")
+    return ', '.join(attributes)
+
+
+def _rows(records, columns):
+    return [[record.get(column) for column in columns] for record in records or []]
+
+
+def render_du(roles):
+    """psql \\du output from the du evidence rows."""
+    rows = [[role['rolname'], _role_attributes(role), role['memberof']] for role in roles or []]
+    return render_table(DU_COLUMNS, rows, title='List of roles', footer=False)
+
+
+def render_dp(privileges):
+    """psql \\dp output from the dp evidence rows."""
+    return render_table(DP_COLUMNS, _rows(privileges, DP_COLUMNS), title='Access privileges', footer=False)
+
+
+def render_query(records, default_columns):
+    """psql output of a plain SELECT from json rows; column names come from the first row."""
+    columns = list(records[0]) if records else default_columns
+    return render_table(columns, _rows(records, columns))
+
+
+def collect_evidence(connection, keys=EVIDENCE_KEYS):
+    """
+    Collect the evidence the checks need from an open database connection.
+
+    Replaces five psql subprocesses (\\du, \\dp, pg_extension, show
+    password_encryption, pg_available_extensions) with a single query on
+    the connection the scan already holds. The returned strings use psql's
+    aligned table layout so finding details read the same as before.
+
+    :param connection: psycopg2 connection to the database being checked
+    :param keys: Evidence to collect (default: all of EVIDENCE_KEYS); no keys, no query
+    :return: Dictionary with the requested keys (du, dp, extensions,
+        password_encryption, pgcrypto) as rendered text, plus the decoded rows under 'rows'
+    """
+    if not keys:
+        return render_evidence({})
+
+    with connection.cursor() as cursor:
+        cursor.execute(evidence_query(keys))
+        values = cursor.fetchone()
+
+    rows = {}
+    for key, value in zip(keys, values):
+        # password_encryption is a plain setting; every other column is a json array
+        rows[key] = value if key == 'password_encryption' else value or []
+    return render_evidence(rows)
+
+
+def render_evidence(rows):
+    """
+    Render decoded evidence rows (collect_evidence()['rows'], or a snapshot's) as psql text.
+
+    :param rows: Dictionary with du, dp, extensions, password_encryption and/or pgcrypto rows
+    :return: Dictionary in the collect_evidence() format, with the keys present in rows
+    """
+    renderers = {
+        'du': render_du,
+        'dp': render_dp,
+        'extensions': lambda records: render_query(records, EXTENSION_COLUMNS),
+        'password_encryption': lambda value: render_table(['password_encryption'], [[value]]),
+        'pgcrypto': lambda records: render_query(records, AVAILABLE_EXTENSION_COLUMNS)
+    }
+    evidence = {key: render(rows[key]) for key, render in renderers.items() if key in rows}
+    evidence['rows'] = rows
+    return evidence
+
+
+def read_fingerprint(connection):
+    """
+    Read the cheap per-database fingerprint (FINGERPRINT_QUERY).
+
+    :param connection: psycopg2 connection to the database being checked
+    :return: Dictionary of FINGERPRINT_COLUMNS: server version, role, ACL and
+        extension digests, password_encryption and pgcrypto availability
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(FINGERPRINT_QUERY)
+        return dict(zip(FINGERPRINT_COLUMNS, cursor.fetchone()))
+
+
+def evidence_fingerprint(database_fingerprint, settings, context=None):
+    """
+    Combine a database fingerprint with the server's settings into one digest.
+
+    Equal digests mean the checks would see the same evidence and produce
+    the same checklist as the run that stored the digest.
+
+    :param database_fingerprint: read_fingerprint() result
+    :param settings: Server settings the checks read (serverSettings)
+    :param context: Anything else the checklist depends on, e.g. the template hash
+    :return: Hex SHA-256 digest
+    """
+    material = {'database': database_fingerprint, 'settings': settings, 'context': context}
+    canonical = json.dumps(material, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
@@ -0,0 +1,79 @@
+import glob
+import json
+import os
+
+from checklistIO import write_checklist
+
+# One file per database, next to the checklists: results[/<environment>]/evidence/<server>_<database>.evidence.json
+SNAPSHOT_DIR = 'evidence'
+SNAPSHOT_SUFFIX = '.evidence.json'
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_path(server_name, database, environment=None, results_dir='./results'):
+    """
+    Path of the evidence snapshot for one database.
+
+    :param server_name: Server the database lives on
+    :param database: Database name
+    :param environment: Environment tag from discover_servers(), if any
+    :param results_dir: Results directory the checklists are written to
+    :return: Snapshot file path
+    """
+    if environment:
+        results_dir = os.path.join(results_dir, environment)
+    return os.path.join(results_dir, SNAPSHOT_DIR, f'{server_name}_{database}{SNAPSHOT_SUFFIX}')
+
+
+def save_snapshot(path, server_name, database, settings, rows, fingerprint=None, environment=None):
+    """
+    Save everything the checks read for one database, so the checklist can be rebuilt offline.
+
+    Evidence is kept as the decoded query rows rather than rendered text;
+    replay renders it again, so changes to the rendering are picked up too.
+
+    :param path: snapshot_path() for the database
+    :param server_name: Server the database lives on
+    :param database: Database name
+    :param settings: Server settings the checks read (version, parameters, pki_certs)
+    :param rows: collect_evidence()['rows']: du, dp, extensions, password_encryption, pgcrypto
+    :param fingerprint: read_fingerprint() result the evidence was collected under
+    :param environment: Environment tag, if any
+    :return: Number of bytes written
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'server': server_name,
+        'database': database,
+        'environment': environment,
+        'settings': settings,
+        'fingerprint': fingerprint,
+        'evidence': rows
+    }
+    return write_checklist(snapshot, path, compact=True, default=str)
+
+
+def load_snapshot(path):
+    """
+    Load an evidence snapshot.
+
+    :param path: Snapshot file path
+    :return: Snapshot dictionary (see save_snapshot)
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        snapshot = json.load(file)
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported evidence snapshot version in {path}: {snapshot.get('version')}")
+    return snapshot
+
+
+def find_snapshots(results_dir='./results'):
+    """
+    Every evidence snapshot under results_dir, including per-environment directories.
+
+    :param results_dir: Results directory the checklists are written to
+    :return: Sorted snapshot file paths
+    """
+    pattern = os.path.join(results_dir, '**', SNAPSHOT_DIR, f'*{SNAPSHOT_SUFFIX}')
+    return sorted(glob.glob(pattern, recursive=True))
@@ -0,0 +1,103 @@
+import hashlib
+
+# How new finding details are combined with the details already on a rule
+#   append        - legacy behaviour: original + "\n" + new, grows on every run
+#   replace       - keep only the details written by this run
+#   append_if_new - append as a new segment unless an identical segment is already there
+#   keep_last     - append as a new segment and keep only the last N segments; segments
+#                   written by this run are never dropped
+DETAILS_POLICIES = ('append', 'replace', 'append_if_new', 'keep_last')
+DEFAULT_KEEP_LAST = 3
+
+# Policies that drop old details; DetailsMerger applies them against the details a rule
+# had before the run, so several checks writing to one rule do not overwrite each other
+RUN_SCOPED_POLICIES = ('replace', 'keep_last')
+
+# Segment-aware policies separate evidence blocks with this line, since the
+# evidence itself (\du, \dp output) spans several lines
+SEGMENT_SEPARATOR = '\n#####\n'
+
+
+def split_segments(details):
+    """
+    Split finding details into the segments written by the segment-aware policies.
+
+    Details written by the legacy append policy come back as a single segment.
+    """
+    if not details:
+        return []
+    return [segment for segment in details.split(SEGMENT_SEPARATOR) if segment.strip()]
+
+
+def _segment_hash(segment):
+    return hashlib.sha256(segment.strip().encode('utf-8')).digest()
+
+
+def merge_finding_details(original_details, new_details, policy='append', keep=DEFAULT_KEEP_LAST, written=()):
+    """
+    Combine existing and new finding details according to a merge policy.
+
+    :param original_details: Current finding_details of the rule; for replace and keep_last
+        with written details, the finding_details the rule had before the run
+    :param new_details: Details produced by the check
+    :param policy: One of DETAILS_POLICIES
+    :param keep: Number of segments kept by the keep_last policy
+    :param written: Details already written to the rule earlier in the same run; replace
+        and keep_last keep them in front of new_details
+    :return: New finding_details value
+    """
+    if policy == 'append':
+        return f"{original_details}\n{new_details}".strip() if original_details else new_details
+
+    if policy == 'replace':
+        return SEGMENT_SEPARATOR.join([*written, new_details])
+
+    if policy == 'append_if_new':
+        segments = split_segments(original_details)
+        if _segment_hash(new_details) in {_segment_hash(segment) for segment in segments}:
+            return original_details
+        return SEGMENT_SEPARATOR.join(segments + [new_details])
+
+    if policy == 'keep_last':
+        if keep < 1:
+            raise ValueError(f"keep_last needs at least one segment, got {keep}")
+        run_segments = [*written, new_details]
+        older = keep - len(run_segments)
+        segments = (split_segments(original_details)[-older:] if older > 0 else []) + run_segments
+        return SEGMENT_SEPARATOR.join(segments)
+
+    raise ValueError(f"Invalid details policy: {policy}. Must be one of {DETAILS_POLICIES}")
+
+
+class DetailsMerger:
+    """
+    Merge one run's finding details into rules.
+
+    Remembers, per rule, the details it had when the run first touched it and
+    everything the run wrote since. replace and keep_last are applied against
+    the former, so a second check writing to the same rule keeps the first
+    check's evidence; the append policies work on the current details as before.
+
+    :param policy: One of DETAILS_POLICIES
+    :param keep: Number of segments kept by the keep_last policy
+    """
+
+    def __init__(self, policy='append', keep=DEFAULT_KEEP_LAST):
+        self.policy = policy
+        self.keep = keep
+        self._runs = {}
+
+    def merge(self, key, current_details, new_details):
+        """
+        Combine a rule's details with new details.
+
+        :param key: Any hashable identifying the rule within the run
+        :param current_details: finding_details the rule has now
+        :param new_details: Details produced by the check
+        :return: New finding_details value
+        """
+        before, written = self._runs.setdefault(key, (current_details, []))
+        original = before if self.policy in RUN_SCOPED_POLICIES else current_details
+        merged = merge_finding_details(original, new_details, self.policy, self.keep, written)
+        written.append(new_details)
+        return merged
@@ -6,15 +6,23 @@ from azure.core.exceptions import ResourceNotFoundError
 import psycopg2
 from datetime import datetime
 import csv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import os
 from dataclasses import dataclass
 import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from connectionPool import ServerConnectionPool
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Servers audited at once, and database connections open at once across all servers
+MAX_SERVERS = int(os.environ.get('AUDIT_MAX_SERVERS', '20'))
+MAX_CONNECTIONS = int(os.environ.get('AUDIT_MAX_CONNECTIONS', '50'))
+
 @dataclass
 class DatabasePermission:
     level: str
@@ -25,9 +33,10 @@ class DatabasePermission:
     permissions: List[str]
 
 class PostgreSQLPermissionAuditor:
-    def __init__(self, subscription_id: str):
+    def __init__(self, subscription_id: str, pool_size: int = 8):
         self.credential = DefaultAzureCredential()
         self.subscription_id = subscription_id
+        self.pool_size = pool_size
         self.postgresql_client = PostgreSQLManagementClient(
             credential=self.credential,
             subscription_id=subscription_id
@@ -35,11 +44,9 @@ class PostgreSQLPermissionAuditor:
 
     async def get_all_servers(self) -> List[Server]:
         """Get all PostgreSQL Flex servers in the subscription."""
-        servers = []
         try:
-            async for server in self.postgresql_client.servers.list():
-                servers.append(server)
-            return servers
+            # The management client is synchronous; page through it on a worker thread
+            return await asyncio.to_thread(lambda: list(self.postgresql_client.servers.list()))
         except Exception as e:
             logger.error(f"Error listing servers: {str(e)}")
             raise
@@ -66,6 +73,18 @@ class PostgreSQLPermissionAuditor:
             logger.error(f"Error getting connection info for server {server.name}: {str(e)}")
             raise
 
+    @staticmethod
+    def connect_database(conn_info: Dict[str, str], database: str):
+        """Connect to one database on a server."""
+        return psycopg2.connect(
+            host=conn_info['host'],
+            user=conn_info['user'],
+            password=conn_info['password'],
+            port=conn_info['port'],
+            database=database,
+            sslmode=conn_info['sslmode']
+        )
+
     def get_database_permissions(self, connection, database: str) -> List[DatabasePermission]:
         """Get database-level permissions."""
         permissions = []
@@ -168,23 +187,10 @@ class PostgreSQLPermissionAuditor:
             logger.error(f"Error getting table permissions for {database}: {str(e)}")
             raise
 
-    async def audit_server_permissions(self, server: Server) -> List[DatabasePermission]:
-        """Audit permissions for a single server."""
-        all_permissions = []
-        try:
-            conn_info = await self.get_server_connection_info(server)
-            
-            # Connect to default database first to get list of databases
-            connection = psycopg2.connect(
-                host=conn_info['host'],
-                user=conn_info['user'],
-                password=conn_info['password'],
-                port=conn_info['port'],
-                database='postgres',
-                sslmode=conn_info['sslmode']
-            )
-            
-            # Get list of databases
+    def list_databases(self, pool: ServerConnectionPool) -> List[str]:
+        """Get the databases to audit on a server (blocking; runs on a worker thread)."""
+        # Connect to default database first to get list of databases
+        with pool.connection('postgres') as connection:
             with connection.cursor() as cursor:
                 cursor.execute("""
                     SELECT datname FROM pg_database 
@@ -192,30 +198,62 @@ class PostgreSQLPermissionAuditor:
                     AND datname NOT IN ('postgres', 'azure_maintenance');
                 """)
                 databases = [row[0] for row in cursor.fetchall()]
+        
+        # The postgres connection is not audited; let it go before opening the others
+        pool.close('postgres')
+        return databases
+
+    def audit_database(self, pool: ServerConnectionPool, database: str) -> List[DatabasePermission]:
+        """Audit one database (blocking; runs on a worker thread)."""
+        logger.info(f"Auditing database: {database}")
+        with pool.connection(database) as connection:
+            # Get database permissions
+            permissions = self.get_database_permissions(connection, database)
             
-            connection.close()
-            
-            # Audit each database
-            for database in databases:
-                logger.info(f"Auditing database: {database}")
-                connection = psycopg2.connect(
-                    host=conn_info['host'],
-                    user=conn_info['user'],
-                    password=conn_info['password'],
-                    port=conn_info['port'],
-                    database=database,
-                    sslmode=conn_info['sslmode']
-                )
-                
-                # Get database permissions
-                db_permissions = self.get_database_permissions(connection, database)
-                all_permissions.extend(db_permissions)
-                
-                # Get table permissions
-                table_permissions = self.get_table_permissions(connection, database)
-                all_permissions.extend(table_permissions)
-                
-                connection.close()
+            # Get table permissions
+            permissions.extend(self.get_table_permissions(connection, database))
+        return permissions
+
+    async def audit_server_permissions(
+        self,
+        server: Server,
+        connection_limit: Optional[asyncio.Semaphore] = None,
+        on_permissions: Optional[Callable[[Server, List[DatabasePermission]], None]] = None
+    ) -> List[DatabasePermission]:
+        """
+        Audit permissions for a single server.
+
+        Databases are audited concurrently on worker threads, at most pool_size
+        at a time per server and, when connection_limit is given, within that
+        limit across all servers. on_permissions is called on the event loop
+        with each database's permissions as soon as the database is done.
+        """
+        all_permissions = []
+        pool = None
+        try:
+            conn_info = await self.get_server_connection_info(server)
+
+            # Warm connections to every database on the server, closed once the server is audited
+            pool = ServerConnectionPool(partial(self.connect_database, conn_info), max_size=self.pool_size)
+            server_limit = asyncio.Semaphore(self.pool_size)
+            connection_limit = connection_limit or asyncio.Semaphore(self.pool_size)
+
+            async with connection_limit:
+                databases = await asyncio.to_thread(self.list_databases, pool)
+
+            async def audit(database: str) -> List[DatabasePermission]:
+                async with server_limit, connection_limit:
+                    permissions = await asyncio.to_thread(self.audit_database, pool, database)
+                if on_permissions is not None:
+                    on_permissions(server, permissions)
+                return permissions
+
+            # Audit each database; let every audit finish before reporting the first failure
+            results = await asyncio.gather(*(audit(database) for database in databases), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+                all_permissions.extend(result)
             
             return all_permissions
             
@@ -223,6 +261,10 @@ class PostgreSQLPermissionAuditor:
             logger.error(f"Error auditing server {server.name}: {str(e)}")
             raise
 
+        finally:
+            if pool is not None:
+                pool.close_all()
+
 async def main():
     # Get subscription ID from environment variable
     subscription_id = os.environ.get('AZURE_SUBSCRIPTION_ID')
@@ -232,6 +274,11 @@ async def main():
     auditor = PostgreSQLPermissionAuditor(subscription_id)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = f'postgres_permissions_audit_{timestamp}.csv'
+
+    # Blocking psycopg2 calls run on worker threads; one thread per connection that may be open at once
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONNECTIONS))
+    server_limit = asyncio.Semaphore(MAX_SERVERS)
+    connection_limit = asyncio.Semaphore(MAX_CONNECTIONS)
     
     try:
         servers = await auditor.get_all_servers()
@@ -241,27 +288,32 @@ async def main():
                          'grantee', 'permissions', 'audit_timestamp']
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
-            
-            for server in servers:
-                logger.info(f"Processing server: {server.name}")
-                try:
-                    permissions = await auditor.audit_server_permissions(server)
-                    
-                    for perm in permissions:
-                        writer.writerow({
-                            'server_name': server.name,
-                            'level': perm.level,
-                            'database': perm.database,
-                            'schema': perm.schema or '',
-                            'table': perm.table or '',
-                            'grantee': perm.grantee,
-                            'permissions': ','.join(perm.permissions),
-                            'audit_timestamp': timestamp
-                        })
-                        
-                except Exception as e:
-                    logger.error(f"Error processing server {server.name}: {str(e)}")
-                    continue
+
+            def write_permissions(server: Server, permissions: List[DatabasePermission]):
+                # Called on the event loop as each database finishes, so rows never interleave
+                for perm in permissions:
+                    writer.writerow({
+                        'server_name': server.name,
+                        'level': perm.level,
+                        'database': perm.database,
+                        'schema': perm.schema or '',
+                        'table': perm.table or '',
+                        'grantee': perm.grantee,
+                        'permissions': ','.join(perm.permissions),
+                        'audit_timestamp': timestamp
+                    })
+                csvfile.flush()
+
+            async def process_server(server: Server):
+                async with server_limit:
+                    logger.info(f"Processing server: {server.name}")
+                    try:
+                        await auditor.audit_server_permissions(server, connection_limit, write_permissions)
+                    except Exception as e:
+                        logger.error(f"Error processing server {server.name}: {str(e)}")
+
+            # Every server is audited concurrently, MAX_SERVERS at a time
+            await asyncio.gather(*(process_server(server) for server in servers))
         
         logger.info(f"Audit complete! Results written to {output_file}")
         
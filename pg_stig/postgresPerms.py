@@ -1,24 +1,44 @@
+import argparse
+import os
 import subprocess
-import json
 import csv
 from datetime import datetime
 import psycopg2
 from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-def run_az_command(command: str) -> List[Dict[Any, Any]]:
-    """Execute Azure CLI command and return JSON response."""
+from azCli import AzCli, display_command
+from azureClient import BACKENDS, CLOUDS, create_azure_client
+from connectionPool import ServerConnectionPool
+from subscriptionConfig import discover_servers, load_subscriptions, select_subscriptions
+
+# Maximum number of database connections kept open per server
+POOL_SIZE = 8
+
+# az calls go through azCli, which memoizes them per run and caches server lists on disk
+az_cli = AzCli()
+
+def run_az_command(command) -> List[Dict[Any, Any]]:
+    """Execute Azure CLI command (argument list or command line) and return JSON response."""
     try:
-        result = subprocess.run(
-            command.split(),
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return json.loads(result.stdout)
+        return az_cli.run(command)
     except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {command}")
+        print(f"Error executing command: {display_command(command)}")
         print(f"Error message: {e.stderr}")
         return []
+    except ValueError as e:
+        # Unparseable command line or output
+        print(f"Error executing command: {display_command(command)}")
+        print(f"Error message: {e}")
+        return []
+
+def connect_database(admin_creds: Dict[str, Any], database: str):
+    """Connect to one database using the server's admin connection string."""
+    # Parse connection string and connect
+    conn_info = admin_creds['connectionStrings']['psql']
+    # Note: You'll need to modify this based on your authentication method
+    return psycopg2.connect(conn_info.replace('dbname=postgres', f'dbname={database}'))
 
 def get_database_permissions(connection, database: str) -> List[Dict[str, str]]:
     """Get database-level permissions."""
@@ -91,9 +111,136 @@ def get_table_permissions(connection, database: str) -> List[Dict[str, str]]:
     
     return permissions
 
+def audit_server(azure, server: Dict[str, Any], timestamp: str) -> List[Dict[str, str]]:
+    """
+    Read the database and table permissions of every database on one server.
+
+    :param azure: azureClient.AzureClient
+    :param server: Server dictionary from list_servers() or discover_servers()
+    :param timestamp: Audit timestamp written to every row
+    :return: CSV rows; empty when the server could not be audited
+    """
+    server_name = server['name']
+    environment = server.get('environment')
+    if environment:
+        print(f"\nProcessing server: {server_name} ({environment})")
+    else:
+        print(f"\nProcessing server: {server_name}")
+    rows = []
+    
+    # Get admin credentials
+    admin_creds = azure.connection_strings(server_name)
+    
+    if not admin_creds:
+        print(f"Skipping server {server_name} - couldn't get credentials")
+        return rows
+    
+    # Every database on the server shares one pool of warm connections
+    pool = ServerConnectionPool(partial(connect_database, admin_creds), max_size=POOL_SIZE)
+
+    try:
+        connection = pool.get('postgres')
+        
+        # Get list of databases
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT datname FROM pg_database 
+                WHERE datistemplate = false;
+            """)
+            databases = [row[0] for row in cursor.fetchall()]
+        
+        # For each database, get permissions
+        for database in databases:
+            print(f"Processing database: {database}")
+            
+            # Connection to the specific database, from the server's pool
+            connection = pool.get(database)
+            
+            # Get database permissions
+            db_permissions = get_database_permissions(connection, database)
+            for perm in db_permissions:
+                rows.append({
+                    'server_name': server_name,
+                    'level': perm['level'],
+                    'database': perm['database'],
+                    'schema': '',
+                    'table': '',
+                    'grantee': perm['grantee'],
+                    'permissions': ','.join(perm['permissions']),
+                    'audit_timestamp': timestamp
+                })
+            
+            # Get table permissions
+            table_permissions = get_table_permissions(connection, database)
+            for perm in table_permissions:
+                rows.append({
+                    'server_name': server_name,
+                    'level': perm['level'],
+                    'database': perm['database'],
+                    'schema': perm['schema'],
+                    'table': perm['table'],
+                    'grantee': perm['grantee'],
+                    'permissions': ','.join(perm['permissions']),
+                    'audit_timestamp': timestamp
+                })
+        
+    except Exception as e:
+        print(f"Error processing server {server_name}: {str(e)}")
+
+    finally:
+        pool.close_all()
+
+    if environment:
+        for row in rows:
+            row['environment'] = environment
+    return rows
+
 def main():
-    # Get all PostgreSQL Flex servers
-    servers = run_az_command('az postgres flexible-server list')
+    parser = argparse.ArgumentParser(description='Audit database and table permissions on every PostgreSQL Flexible Server to CSV')
+    parser.add_argument(
+        '--azure-backend',
+        choices=BACKENDS,
+        default='cli',
+        help='How Azure is queried: az CLI subprocesses (default) or the in-process Azure SDK'
+    )
+    parser.add_argument(
+        '--subscription',
+        help='Subscription ID for the sdk backend (default: AZURE_SUBSCRIPTION_ID)'
+    )
+    parser.add_argument(
+        '--cloud',
+        choices=list(CLOUDS),
+        default='AzureUSGovernment',
+        help='Azure cloud for the sdk backend (default AzureUSGovernment)'
+    )
+    parser.add_argument(
+        '--environment',
+        nargs='+',
+        choices=list(load_subscriptions()) + ['all'],
+        help='Environment(s) from subscriptions.txt to audit in one run; rows are tagged with their environment (default: the active subscription)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of servers audited in parallel (default 1); rows are still written in server order'
+    )
+    args = parser.parse_args()
+
+    # az subprocesses (through the shared az layer) or in-process Azure SDK clients
+    azure = create_azure_client(
+        args.azure_backend,
+        run=run_az_command,
+        subscription_id=args.subscription or os.environ.get('AZURE_SUBSCRIPTION_ID'),
+        cloud=args.cloud
+    )
+
+    # Get all PostgreSQL Flex servers; with --environment every subscription is listed at once
+    # and its servers are tagged with their environment
+    if args.environment:
+        servers = discover_servers(azure, select_subscriptions(args.environment))
+    else:
+        servers = azure.list_servers()
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = f'postgres_permissions_audit_{timestamp}.csv'
@@ -101,78 +248,15 @@ def main():
     with open(output_file, 'w', newline='') as csvfile:
         fieldnames = ['server_name', 'level', 'database', 'schema', 'table', 
                      'grantee', 'permissions', 'audit_timestamp']
+        if args.environment:
+            fieldnames.insert(0, 'environment')
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
         
-        for server in servers:
-            server_name = server['name']
-            print(f"\nProcessing server: {server_name}")
-            
-            # Get admin credentials
-            admin_creds = run_az_command(
-                f'az postgres flexible-server show-connection-string --server-name {server_name}'
-            )
-            
-            if not admin_creds:
-                print(f"Skipping server {server_name} - couldn't get credentials")
-                continue
-            
-            try:
-                # Parse connection string and connect
-                conn_info = admin_creds['connectionStrings']['psql']
-                # Note: You'll need to modify this based on your authentication method
-                connection = psycopg2.connect(conn_info)
-                
-                # Get list of databases
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT datname FROM pg_database 
-                        WHERE datistemplate = false;
-                    """)
-                    databases = [row[0] for row in cursor.fetchall()]
-                
-                # For each database, get permissions
-                for database in databases:
-                    print(f"Processing database: {database}")
-                    
-                    # Reconnect to specific database
-                    connection.close()
-                    conn_info_db = conn_info.replace('dbname=postgres', f'dbname={database}')
-                    connection = psycopg2.connect(conn_info_db)
-                    
-                    # Get database permissions
-                    db_permissions = get_database_permissions(connection, database)
-                    for perm in db_permissions:
-                        writer.writerow({
-                            'server_name': server_name,
-                            'level': perm['level'],
-                            'database': perm['database'],
-                            'schema': '',
-                            'table': '',
-                            'grantee': perm['grantee'],
-                            'permissions': ','.join(perm['permissions']),
-                            'audit_timestamp': timestamp
-                        })
-                    
-                    # Get table permissions
-                    table_permissions = get_table_permissions(connection, database)
-                    for perm in table_permissions:
-                        writer.writerow({
-                            'server_name': server_name,
-                            'level': perm['level'],
-                            'database': perm['database'],
-                            'schema': perm['schema'],
-                            'table': perm['table'],
-                            'grantee': perm['grantee'],
-                            'permissions': ','.join(perm['permissions']),
-                            'audit_timestamp': timestamp
-                        })
-                
-                connection.close()
-                
-            except Exception as e:
-                print(f"Error processing server {server_name}: {str(e)}")
-                continue
+        # Servers from every subscription share one worker pool
+        with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+            for rows in executor.map(partial(audit_server, azure, timestamp=timestamp), servers):
+                writer.writerows(rows)
     
     print(f"\nAudit complete! Results written to {output_file}")
 
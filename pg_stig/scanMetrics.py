@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class ScanMetrics:
+    """
+    Wall time per phase and run-wide counters for a fleet scan.
+
+    phase() times a block and attributes it to a server/database; nested
+    phases on the same thread inherit that attribution, so code deep in the
+    scan (az calls, connects, queries) only has to name its phase. count()
+    adds to a counter for the run and for the current server. Every phase
+    is appended to the JSON lines file as it finishes; close() adds a
+    'counters' line and summary() renders the slowest servers and phases.
+
+    :param metrics_path: JSON lines file to write (None keeps records in memory only)
+    """
+
+    def __init__(self, metrics_path=None):
+        self.records = []
+        self.counters = Counter()
+        self.server_counters = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+        self._started = time.perf_counter()
+        if metrics_path:
+            self.open(metrics_path)
+
+    def open(self, metrics_path):
+        """Start writing records to metrics_path (JSON lines)."""
+        with self._lock:
+            self.path = metrics_path
+            self._file = open(metrics_path, 'w', encoding='utf-8')
+            self._started = time.perf_counter()
+
+    def _context(self):
+        return getattr(self._local, 'context', {})
+
+    @contextmanager
+    def phase(self, name, **context):
+        """
+        Time a block of work.
+
+        :param name: Phase name, e.g. 'server', 'connect', 'evidence', 'save'
+        :param context: server=, database=, environment= ... for this phase and the phases nested in it
+        """
+        previous = self._context()
+        self._local.context = {**previous, **{key: value for key, value in context.items() if value is not None}}
+        started_at = datetime.now().isoformat(timespec='milliseconds')
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            record = {
+                'type': 'phase',
+                'phase': name,
+                **self._local.context,
+                'start': started_at,
+                'seconds': round(time.perf_counter() - start, 6)
+            }
+            if error is not None:
+                record['error'] = error
+            self._local.context = previous
+            self.add_records([record])
+
+    def count(self, name, amount=1):
+        """Add amount to a counter for the run and for the current server."""
+        server = self._context().get('server')
+        with self._lock:
+            self.counters[name] += amount
+            if server is not None:
+                self.server_counters[server][name] += amount
+
+    def add_records(self, records):
+        """Store (and write) phase records."""
+        with self._lock:
+            self.records.extend(records)
+            if self._file is not None:
+                for record in records:
+                    self._file.write(json.dumps(record, default=str) + '\n')
+                self._file.flush()
+
+    def drain(self):
+        """
+        Remove and return what was collected so far, for handing to another process.
+
+        :return: (phase records, counters, per-server counters) to pass to merge()
+        """
+        with self._lock:
+            drained = (self.records, dict(self.counters), {server: dict(counters) for server, counters in self.server_counters.items()})
+            self.records = []
+            self.counters = Counter()
+            self.server_counters = defaultdict(Counter)
+        return drained
+
+    def merge(self, records, counters=None, server_counters=None):
+        """Add the output of another process's drain()."""
+        self.add_records(records)
+        with self._lock:
+            self.counters.update(counters or {})
+            for server, counts in (server_counters or {}).items():
+                self.server_counters[server].update(counts)
+
+    def timed(self, name, context, function, *args):
+        """
+        Call function(*args) inside phase(name, **context).
+
+        Worker threads do not inherit the submitting thread's attribution, so
+        pass server/database explicitly when submitting to an executor.
+        """
+        with self.phase(name, **context):
+            return function(*args)
+
+    def phase_totals(self):
+        """{phase: {'count', 'seconds', 'max'}} over every record."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record['phase'], {'count': 0, 'seconds': 0.0, 'max': 0.0})
+            total['count'] += 1
+            total['seconds'] += record['seconds']
+            total['max'] = max(total['max'], record['seconds'])
+        return totals
+
+    def summary(self, top=10):
+        """
+        End-of-run report: run time, counters, the slowest servers and the phases that took longest.
+
+        :param top: Number of servers and phases to list
+        :return: Report text
+        """
+        with self._lock:
+            servers = sorted(
+                (record for record in self.records if record['phase'] == 'server'),
+                key=lambda record: record['seconds'], reverse=True
+            )[:top]
+            phases = sorted(self.phase_totals().items(), key=lambda item: item[1]['seconds'], reverse=True)[:top]
+            counters = dict(self.counters)
+
+        lines = [f"\nRun time: {time.perf_counter() - self._started:.1f}s"]
+        if counters:
+            lines.append('Counters: ' + ', '.join(f'{name}={value}' for name, value in sorted(counters.items())))
+        if servers:
+            lines.append(f"Slowest servers (top {len(servers)}):")
+            for record in servers:
+                label = record.get('server', '?')
+                if record.get('environment'):
+                    label += f" ({record['environment']})"
+                lines.append(f"  {record['seconds']:10.3f}s  {label}")
+        if phases:
+            lines.append(f"Slowest phases by total time (top {len(phases)}):")
+            for name, total in phases:
+                lines.append(f"  {total['seconds']:10.3f}s  {name:<16} count={total['count']} max={total['max']:.3f}s")
+        return '\n'.join(lines)
+
+    def close(self, extra_counters=None):
+        """
+        Write the run totals and close the metrics file.
+
+        :param extra_counters: Other counters to report with the run's own, e.g. AzCli.stats
+        """
+        with self._lock:
+            if extra_counters:
+                self.counters.update(extra_counters)
+            if self._file is not None:
+                totals = {
+                    'type': 'counters',
+                    'seconds': round(time.perf_counter() - self._started, 6),
+                    'counters': dict(self.counters),
+                    'servers': {server: dict(counters) for server, counters in self.server_counters.items()}
+                }
+                self._file.write(json.dumps(totals) + '\n')
+                self._file.close()
+                self._file = None
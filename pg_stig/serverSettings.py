@@ -0,0 +1,76 @@
+# Server parameters the checks read, by parameter name, and the settings key each one is stored under
+SETTING_KEYS = {
+    'server_version': 'server_version',
+    'shared_preload_libraries': 'shared_preload_libraries',
+    'log_disconnections': 'log_disconnections',
+    'log_connections': 'log_connections',
+    'pgaudit.log': 'pgaudit_log',
+    'ssl': 'ssl_enabled',
+    'log_line_prefix': 'log_line_prefix',
+    'log_timezone': 'log_timezone',
+    'client_min_messages': 'client_min_messages',
+    'port': 'port',
+    'log_destination': 'log_destination'
+}
+
+# Certificate and key file parameters, reported together as 'pki_certs'
+PKI_PARAMETERS = ('ssl_ca_file', 'ssl_cert_file', 'ssl_key_file', 'ssl_crl_file')
+
+PG_SETTINGS_QUERY = """
+    SELECT name, setting FROM pg_catalog.pg_settings
+    WHERE name = ANY(%s)
+    ORDER BY name;
+"""
+
+
+def settings_from_parameters(parameters):
+    """
+    Build the settings dictionary the checks use from server parameters.
+
+    :param parameters: Iterable of {'name': ..., 'value': ...} as returned by
+        az postgres flexible-server parameter list (or read from pg_settings)
+    :return: Dictionary keyed by SETTING_KEYS values plus 'pki_certs'
+    """
+    settings = {'pki_certs': ""}
+    for params in parameters:
+        name = params['name']
+        if name in SETTING_KEYS:
+            settings[SETTING_KEYS[name]] = params['value']
+        elif name in PKI_PARAMETERS:
+            settings['pki_certs'] += f"{name} = {params['value']}\n"
+    return settings
+
+
+def missing_settings(settings):
+    """Settings keys the checks need that are not in settings."""
+    return [key for key in SETTING_KEYS.values() if key not in settings]
+
+
+def read_server_settings(connection, fallback=None):
+    """
+    Read the server parameters the checks use from pg_settings.
+
+    Parameters pg_settings does not show (pgaudit.log before pgaudit is
+    loaded, settings hidden from the connected role) and certificate
+    files the role cannot see are taken from fallback(), typically the
+    ARM parameter list, which is then only called when something is
+    missing.
+
+    :param connection: Open DB-API connection to any database on the server
+    :param fallback: Optional callable returning a settings dictionary
+    :return: Settings dictionary (see settings_from_parameters)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(PG_SETTINGS_QUERY, (list(SETTING_KEYS) + list(PKI_PARAMETERS),))
+        rows = cursor.fetchall()
+    settings = settings_from_parameters({'name': name, 'value': value} for name, value in rows)
+
+    missing = missing_settings(settings)
+    if (missing or not settings['pki_certs']) and fallback is not None:
+        fallback_settings = fallback()
+        for key in missing:
+            if key in fallback_settings:
+                settings[key] = fallback_settings[key]
+        if not settings['pki_certs']:
+            settings['pki_certs'] = fallback_settings.get('pki_certs', "")
+    return settings
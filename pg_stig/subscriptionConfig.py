@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# shortname:subscription:keyvault, one environment per line (same file newInit.sh reads)
+SUBSCRIPTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'subscriptions.txt')
+
+DEFAULT_ENVIRONMENT = 'prod'
+
+
+@dataclass(frozen=True)
+class SubscriptionConfig:
+    environment: str
+    subscription: str
+    key_vault: str
+
+
+def load_subscriptions(path: str = SUBSCRIPTIONS_FILE) -> Dict[str, SubscriptionConfig]:
+    """
+    Read the subscription dictionary.
+
+    :param path: Path to subscriptions.txt
+    :return: {shortname (lower case): SubscriptionConfig}, in file order
+    """
+    subscriptions = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            environment, subscription, key_vault = line.split(':', 2)
+            subscriptions[environment.lower()] = SubscriptionConfig(environment.lower(), subscription, key_vault)
+    return subscriptions
+
+
+def get_subscription(environment: str = DEFAULT_ENVIRONMENT, path: str = SUBSCRIPTIONS_FILE) -> SubscriptionConfig:
+    """
+    Look up one environment (case-insensitive, like newInit.sh).
+
+    :raises ValueError: When the environment is not in the file
+    """
+    subscriptions = load_subscriptions(path)
+    try:
+        return subscriptions[environment.lower()]
+    except KeyError:
+        raise ValueError(f"Subscription shortname '{environment}' not found in {path}. Must be one of {list(subscriptions)}") from None
+
+
+def select_subscriptions(environments: List[str], path: str = SUBSCRIPTIONS_FILE) -> List[SubscriptionConfig]:
+    """
+    Resolve environment shortnames; 'all' selects every environment in the file.
+
+    :return: SubscriptionConfig per environment, in file order
+    """
+    subscriptions = load_subscriptions(path)
+    wanted = {environment.lower() for environment in environments}
+    if 'all' in wanted:
+        return list(subscriptions.values())
+    unknown = wanted - set(subscriptions)
+    if unknown:
+        raise ValueError(f"Subscription shortname(s) {sorted(unknown)} not found in {path}. Must be one of {list(subscriptions)}")
+    return [config for config in subscriptions.values() if config.environment in wanted]
+
+
+def discover_servers(
+    azure,
+    subscriptions: List[SubscriptionConfig],
+    on_discovered: Optional[Callable[[SubscriptionConfig, List[Dict[str, Any]]], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    List the PostgreSQL Flexible Servers of several subscriptions concurrently.
+
+    Every server dictionary is tagged with 'environment' and 'subscription'
+    so later Azure calls target the right subscription and results can be
+    labelled. on_discovered(config, servers) runs as soon as each
+    subscription's list arrives (e.g. to start prefetching its secrets).
+
+    :param azure: azureClient.AzureClient
+    :param subscriptions: Subscriptions to scan
+    :return: All servers, grouped by subscription in the given order
+    """
+    def discover(config):
+        # Tag copies; the az layer may hand the same list to other callers
+        servers = [
+            {**server, 'environment': config.environment, 'subscription': config.subscription}
+            for server in azure.list_servers(config.subscription) or []
+        ]
+        if on_discovered is not None:
+            on_discovered(config, servers)
+        return servers
+
+    with ThreadPoolExecutor(max_workers=max(len(subscriptions), 1)) as executor:
+        results = list(executor.map(discover, subscriptions))
+    return [server for servers in results for server in servers]
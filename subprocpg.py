@@ -1,3 +1,4 @@
+import argparse
 import subprocess
 import json
 import os
@@ -5,6 +6,12 @@ import csv
 import logging
 from datetime import datetime
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pg_stig.azCli import AzCli
+from pg_stig.azureClient import BACKENDS, CLOUDS, AzureClient, CliBackend, create_azure_client
+from pg_stig.scanMetrics import ScanMetrics
+from pg_stig.subscriptionConfig import load_subscriptions, select_subscriptions
 
 # Configure logging
 logging.basicConfig(
@@ -18,25 +25,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class PostgreSQLPermissionAuditor:
-    def __init__(self, subscription_id=None):
+    def __init__(self, subscription_id=None, azure=None, metrics=None, az=None):
         """
         Initialize the auditor with optional subscription ID
         If not provided, uses currently active subscription
+        Azure lookups go through azure (an AzureClient); by default the az CLI
+        Phase timings and counters go to metrics (a ScanMetrics) and az results
+        are memoized by az (an AzCli); both can be shared when several auditors run
         """
+        self.metrics = metrics or ScanMetrics()
+        # az results are memoized for the run; server details are no longer re-fetched per database
+        self.az = az or AzCli()
+        self.azure = azure or AzureClient(CliBackend(self._run_az))
         self.subscription_id = subscription_id or self._get_current_subscription()
 
+    def _run_az(self, command):
+        """
+        az command through the memoizing az layer, timed as an 'az' phase
+        """
+        self.metrics.count('az_commands')
+        with self.metrics.phase('az'):
+            return self.az.run(command)
+
     def _run_command(self, command, capture_output=True, text=True):
         """
         Helper method to run shell commands safely
         """
+        is_psql = 'psql ' in command
+        self.metrics.count('psql_processes' if is_psql else 'shell_commands')
         try:
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=capture_output, 
-                text=text, 
-                check=True
-            )
+            with self.metrics.phase('psql' if is_psql else 'shell'):
+                result = subprocess.run(
+                    command, 
+                    shell=True, 
+                    capture_output=capture_output, 
+                    text=text, 
+                    check=True
+                )
             return result
         except subprocess.CalledProcessError as e:
             logger.error(f"Command failed: {command}")
@@ -48,8 +73,7 @@ class PostgreSQLPermissionAuditor:
         Get currently active Azure subscription
         """
         try:
-            result = self._run_command('az account show')
-            account = json.loads(result.stdout)
+            account = self.azure.current_account()
             return account['id']
         except Exception as e:
             logger.error("Could not retrieve subscription ID")
@@ -60,9 +84,7 @@ class PostgreSQLPermissionAuditor:
         List all PostgreSQL Flexible Servers in the subscription
         """
         try:
-            list_cmd = f'az postgres flexible-server list --subscription {self.subscription_id}'
-            result = self._run_command(list_cmd)
-            return json.loads(result.stdout)
+            return self.azure.list_servers(self.subscription_id)
         except Exception as e:
             logger.error(f"Error listing PostgreSQL servers: {e}")
             return []
@@ -98,13 +120,7 @@ class PostgreSQLPermissionAuditor:
         Uses az postgres flexible-server show and requires admin credentials
         """
         try:
-            show_cmd = (
-                f'az postgres flexible-server show '
-                f'--name {server_name} '
-                f'--resource-group {resource_group}'
-            )
-            result = self._run_command(show_cmd)
-            server_details = json.loads(result.stdout)
+            server_details = self.azure.show_server(resource_group, server_name, self.subscription_id)
             
             # Retrieve admin credentials 
             # Note: In practice, use secure credential management
@@ -212,40 +228,81 @@ class PostgreSQLPermissionAuditor:
             
             # Iterate through servers
             servers = self.list_postgresql_servers()
+            self.metrics.count('servers', len(servers))
             for server in servers:
                 server_name = server['name']
                 resource_group = server['resourceGroup']
                 
                 logger.info(f"Auditing server: {server_name}")
                 
-                # Get databases for this server
-                databases = self.get_server_databases(server_name, resource_group)
-                
-                # Audit each database
-                for database in databases:
-                    try:
-                        permissions = self.get_database_permissions(
-                            server_name, resource_group, database
-                        )
-                        
-                        # Write permissions to CSV
-                        for perm in permissions:
-                            if perm.strip():  # Ensure not empty
-                                parts = perm.split('|')
-                                csv_writer.writerow([
-                                    server_name, resource_group, database, *parts
-                                ])
-                    except Exception as e:
-                        logger.error(f"Error processing {server_name} - {database}: {e}")
+                with self.metrics.phase('server', server=server_name, subscription=self.subscription_id):
+                    # Get databases for this server
+                    databases = self.get_server_databases(server_name, resource_group)
+                    self.metrics.count('databases', len(databases))
+
+                    # Audit each database
+                    for database in databases:
+                        try:
+                            with self.metrics.phase('database', database=database):
+                                permissions = self.get_database_permissions(
+                                    server_name, resource_group, database
+                                )
+
+                            # Write permissions to CSV
+                            for perm in permissions:
+                                if perm.strip():  # Ensure not empty
+                                    parts = perm.split('|')
+                                    csv_writer.writerow([
+                                        server_name, resource_group, database, *parts
+                                    ])
+                        except Exception as e:
+                            logger.error(f"Error processing {server_name} - {database}: {e}")
         
+        self.metrics.count('bytes_written', os.path.getsize(output_file))
         logger.info(f"Audit complete. Results in {output_file}")
         return output_file
 
 def main():
+    parser = argparse.ArgumentParser(description='Audit PostgreSQL Flexible Server permissions to CSV')
+    parser.add_argument(
+        '--environment',
+        nargs='+',
+        choices=list(load_subscriptions()) + ['all'],
+        help='Environment(s) from subscriptions.txt to audit concurrently, one CSV each (default: the active subscription)'
+    )
+    parser.add_argument(
+        '--azure-backend',
+        choices=BACKENDS,
+        default='cli',
+        help='How Azure is queried: az CLI subprocesses (default) or the in-process Azure SDK'
+    )
+    parser.add_argument(
+        '--subscription',
+        help='Subscription to audit without --environment (default: the active subscription; AZURE_SUBSCRIPTION_ID for the sdk backend)'
+    )
+    parser.add_argument(
+        '--cloud',
+        choices=list(CLOUDS),
+        default='AzureUSGovernment',
+        help='Azure cloud for the sdk backend (default AzureUSGovernment)'
+    )
+    parser.add_argument(
+        '--metrics',
+        help='JSON lines file for phase timings and counters (default postgres_audit_metrics_<timestamp>.jsonl)'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=10,
+        help='Number of slowest servers and phases in the end-of-run summary (default 10)'
+    )
+    args = parser.parse_args()
+
     # Prerequisite check
     try:
-        # Verify Azure CLI and psql are installed
-        subprocess.run(['az', '--version'], capture_output=True, check=True)
+        # Verify Azure CLI (unless the SDK backend replaces it) and psql are installed
+        if args.azure_backend == 'cli':
+            subprocess.run(['az', '--version'], capture_output=True, check=True)
         subprocess.run(['psql', '--version'], capture_output=True, check=True)
     except FileNotFoundError:
         logger.error("Please install Azure CLI and PostgreSQL client (psql)")
@@ -255,10 +312,52 @@ def main():
     if not os.environ.get('POSTGRES_ADMIN_PASSWORD'):
         logger.error("Set POSTGRES_ADMIN_PASSWORD environment variable")
         sys.exit(1)
-    
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    metrics = ScanMetrics(args.metrics or f'postgres_audit_metrics_{timestamp}.jsonl')
+    try:
+        run_audits(args, metrics, timestamp)
+    finally:
+        metrics.close()
+        logger.info(metrics.summary(args.top))
+
+
+def sdk_client(args, subscription_id):
+    """
+    In-process Azure SDK client for --azure-backend sdk; None leaves each auditor on the az CLI
+    """
+    if args.azure_backend != 'sdk':
+        return None
+    return create_azure_client('sdk', subscription_id=subscription_id, cloud=args.cloud)
+
+
+def run_audits(args, metrics, timestamp):
+    """
+    Audit the active subscription, or each selected environment concurrently
+    """
     # Run audit
-    auditor = PostgreSQLPermissionAuditor()
-    auditor.audit_servers()
+    if not args.environment:
+        azure = sdk_client(args, args.subscription or os.environ.get('AZURE_SUBSCRIPTION_ID'))
+        auditor = PostgreSQLPermissionAuditor(subscription_id=args.subscription, azure=azure, metrics=metrics)
+        auditor.audit_servers()
+        return
+
+    # One auditor per subscription, sharing the az layer (or one SDK client); each writes
+    # postgres_permissions_audit_<env>_<timestamp>.csv
+    subscriptions = select_subscriptions(args.environment)
+    az = AzCli()
+    azure = sdk_client(args, subscriptions[0].subscription)
+
+    def audit(config):
+        auditor = PostgreSQLPermissionAuditor(subscription_id=config.subscription, azure=azure, metrics=metrics, az=az)
+        return auditor.audit_servers(f'postgres_permissions_audit_{config.environment}_{timestamp}.csv')
+
+    with ThreadPoolExecutor(max_workers=len(subscriptions)) as executor:
+        for config, future in zip(subscriptions, [executor.submit(audit, config) for config in subscriptions]):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error auditing environment {config.environment}: {e}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
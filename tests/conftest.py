@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pg_stig modules import each other by bare name, as when run from pg_stig/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pg_stig'))
@@ -0,0 +1,65 @@
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+from azureClient import SdkBackend
+
+SUBSCRIPTION_ID = '0b1f6471-1bf0-4dda-aec3-cb9272f09590'
+
+
+class ManagementClient:
+    def __init__(self, credential, subscription_id, base_url, credential_scopes):
+        self.subscription_id = subscription_id
+        self.servers = SimpleNamespace(list=lambda: [])
+
+
+class SubscriptionClient:
+    created = 0
+
+    def __init__(self, credential, base_url, credential_scopes):
+        SubscriptionClient.created += 1
+        self.subscriptions = SimpleNamespace(list=lambda: [
+            SimpleNamespace(display_name='AFC-HQAFC-AFCDSE-P', subscription_id=SUBSCRIPTION_ID)
+        ])
+
+
+@pytest.fixture
+def sdk_modules(monkeypatch):
+    # Stand-ins for the Azure SDK packages SdkBackend imports
+    modules = {
+        'azure': types.ModuleType('azure'),
+        'azure.identity': SimpleNamespace(DefaultAzureCredential=object),
+        'azure.keyvault.secrets': SimpleNamespace(SecretClient=object),
+        'azure.mgmt.rdbms.postgresql_flexibleservers': SimpleNamespace(PostgreSQLManagementClient=ManagementClient),
+        'azure.mgmt.subscription': SimpleNamespace(SubscriptionClient=SubscriptionClient),
+    }
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    SubscriptionClient.created = 0
+
+
+def test_subscription_name_is_resolved_to_its_id(sdk_modules):
+    backend = SdkBackend('AFC-HQAFC-AFCDSE-P', credential=object())
+
+    assert backend.list_servers() == []
+    assert backend.list_servers('AFC-HQAFC-AFCDSE-P') == []
+    assert list(backend._management_clients) == [SUBSCRIPTION_ID]
+    assert backend._management().subscription_id == SUBSCRIPTION_ID
+    assert backend.current_account() == {'id': SUBSCRIPTION_ID}
+    assert SubscriptionClient.created == 1
+
+
+def test_subscription_id_is_used_as_given(sdk_modules):
+    backend = SdkBackend(SUBSCRIPTION_ID, credential=object())
+
+    assert backend._management().subscription_id == SUBSCRIPTION_ID
+    assert SubscriptionClient.created == 0
+
+
+def test_unknown_subscription_name(sdk_modules):
+    backend = SdkBackend('AFC-HQAFC-AFCDSE-T', credential=object())
+
+    with pytest.raises(ValueError):
+        backend.list_servers()
@@ -0,0 +1,56 @@
+from checkRegistry import Check, run_checks, select_checks
+from checklistSession import ChecklistSession, ChecklistTemplate
+
+TEMPLATE = {
+    'stigs': [{
+        'stig_id': 'PostgreSQL_9-x_STIG',
+        'rules': [
+            {'rule_id': 'SV-214142r961632', 'group_id': 'V-214142', 'status': 'not_reviewed', 'finding_details': ''},
+            {'rule_id': 'SV-214145r961638', 'group_id': 'V-214145', 'status': 'not_reviewed', 'finding_details': ''},
+        ]
+    }]
+}
+
+
+def ssl_check(checklist):
+    checklist.update_stig_findings([
+        {'rule_id': rule_id, 'finding_details': 'SSL : on', 'status': 'not_a_finding'}
+        for rule_id in ('SV-214142r961632', 'SV-214145r961638')
+    ])
+
+
+def log_line_prefix_check(checklist):
+    checklist.update_stig_findings([
+        {'rule_id': 'SV-214145r961638', 'finding_details': 'log_line_prefix : %m', 'status': 'open'}
+    ])
+
+
+# Two checks in different categories sharing SV-214145
+CHECKS = (
+    Check('ssl_check', ssl_check, 'CAT1', ('SV-214142r961632', 'SV-214145r961638'), ()),
+    Check('log_line_prefix_check', log_line_prefix_check, 'CAT2', ('SV-214145r961638',), ()),
+)
+
+
+def rule_states(session):
+    return [(rule['status'], rule['finding_details']) for rule in session.materialize()['stigs'][0]['rules']]
+
+
+def test_checks_sharing_a_rule_are_selected_together():
+    assert select_checks(CHECKS, categories=['CAT1']) == CHECKS
+    assert select_checks(CHECKS, rules=['SV-214142']) == CHECKS
+    assert select_checks(CHECKS, rules=['V-214145'], categories=['CAT2']) == CHECKS
+
+
+def test_partial_run_matches_full_run():
+    template = ChecklistTemplate(TEMPLATE)
+    full = ChecklistSession(template)
+    run_checks(CHECKS, full, {}, None)
+    assert rule_states(full)[1][0] == 'open'
+
+    for selection in ({'categories': ['CAT1']}, {'rules': ['SV-214142']}, {'categories': ['CAT2']}):
+        checks = select_checks(CHECKS, **selection)
+        partial = ChecklistSession(ChecklistTemplate(full.materialize()))
+        partial.reset_rules((rule for check in checks for rule in check.rules), template)
+        run_checks(checks, partial, {}, None)
+        assert rule_states(partial) == rule_states(full)
@@ -1,7 +1,9 @@
 import json
 import re
 
-def update_checklist_with_database_info(checklist_path, database_info):
+from pg_stig.checklistIO import write_checklist
+
+def update_checklist_with_database_info(checklist_path, database_info, compact=False):
     """
     Update STIG checklist with database-specific information.
     
@@ -10,6 +12,7 @@ def update_checklist_with_database_info(checklist_path, database_info):
         Required keys:
         - 'database_name': Name of the database
         - 'server_name': Server name for FQDN
+    :param compact: Write the checklist without indentation
     
     :return: Updated checklist data
     """
@@ -62,8 +65,7 @@ def update_checklist_with_database_info(checklist_path, database_info):
     # If changes were made, save the updated file
     if changes_made:
         output_path = checklist_path.replace('.json', '_database_updated.json')
-        with open(output_path, 'w') as file:
-            json.dump(checklist, file, indent=2)
+        write_checklist(checklist, output_path, compact=compact)
         
         # Print detailed update summary
         print(f"Updated checklist saved to {output_path}")